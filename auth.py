@@ -1,12 +1,21 @@
-from flask import Blueprint, jsonify, request
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, jsonify, request, g, current_app
 from src.models.user import User, UserSession, db
+from src.routes.session_auth import login_required, get_bearer_token, resolve_session, invalidate_token, invalidate_user
+from src.routes.signed_tokens import issue_token, decode_token, is_signed_token, revocations
+from src.routes.session_purge import purge_expired_sessions, enforce_session_cap, session_metrics, session_table_stats, start_purge_timer
+from src.routes.pagination import count_cache
+from src.routes.password_hasher import password_hasher, HasherBusy, TARGET_HASH_SECONDS
+from src.routes.rate_limit import rate_limit, limit_blueprint
 from datetime import datetime, timedelta
+import click
 import secrets
 import re
 
 auth_bp = Blueprint('auth', __name__)
 
+# Blanket limit on every auth endpoint, the expensive ones have tighter rules of their own
+limit_blueprint(auth_bp, per_ip='60/minute')
+
 def validate_email(email):
     """Validate email format"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -22,11 +31,39 @@ def validate_password(password):
         return False, "Password harus mengandung angka"
     return True, "Password valid"
 
+# Configured hash cost, or one calibrated for this machine when none is set (see calibrate-hasher)
+auth_bp.record_once(lambda state: password_hasher.configure(
+    state.app.config.get('PASSWORD_HASH_ITERATIONS'),
+    state.app.config.get('PASSWORD_HASH_MIN_ITERATIONS')
+))
+
+def hasher_busy_response(error):
+    """503 telling the client to retry once the password hashing pool has room"""
+    response = jsonify({
+        'success': False,
+        'message': 'Server sedang sibuk, silakan coba lagi'
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+@auth_bp.before_app_request
+def start_session_purge():
+    """Start the expired session purge timer when SESSION_PURGE_INTERVAL (seconds) is set"""
+    interval = current_app.config.get('SESSION_PURGE_INTERVAL', 0)
+    if interval:
+        start_purge_timer(current_app._get_current_object(), interval)
+
+def login_email():
+    """Rate limit key of a login attempt: the account it targets"""
+    data = request.get_json(silent=True) or {}
+    return str(data.get('email') or '').strip().lower() or None
+
 def generate_session_token():
     """Generate secure session token"""
     return secrets.token_urlsafe(32)
 
 @auth_bp.route('/register', methods=['POST'])
+@rate_limit('auth.register', per_ip='5/minute')
 def register():
     """User registration endpoint"""
     try:
@@ -83,7 +120,7 @@ def register():
             full_name=full_name,
             phone=phone
         )
-        user.set_password(password)
+        user.password_hash = password_hasher.hash(password)
         
         db.session.add(user)
         db.session.commit()
@@ -94,6 +131,10 @@ def register():
             'user': user.to_public_dict()
         }), 201
         
+    except HasherBusy as e:
+        db.session.rollback()
+        return hasher_busy_response(e)
+        
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -102,6 +143,7 @@ def register():
         }), 500
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit('auth.login', per_ip='10/minute', per_user='5/minute', user_key=login_email)
 def login():
     """User login endpoint"""
     try:
@@ -121,7 +163,7 @@ def login():
         # Find user by email
         user = User.query.filter_by(email=email).first()
         
-        if not user or not user.check_password(password):
+        if not user or not password_hasher.verify(user.password_hash, password):
             return jsonify({
                 'success': False,
                 'message': 'Email atau password salah'
@@ -133,21 +175,38 @@ def login():
                 'message': 'Akun Anda telah dinonaktifkan'
             }), 401
         
-        # Generate session token
-        session_token = generate_session_token()
+        # Upgrade hashes made with weaker parameters while the password is at hand
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = password_hasher.hash(password)
+            except HasherBusy:
+                # The login is valid, the upgrade waits for a quieter moment
+                pass
         
         # Set session expiry (7 days if remember_me, otherwise 1 day)
         expires_at = datetime.utcnow() + timedelta(days=7 if remember_me else 1)
         
-        # Create user session
-        user_session = UserSession(
-            user_id=user.id,
-            session_token=session_token,
-            expires_at=expires_at
-        )
-        
-        db.session.add(user_session)
-        db.session.commit()
+        if current_app.config.get('AUTH_TOKEN_MODE', 'opaque') == 'signed':
+            # Stateless token, verified without the database
+            session_token = issue_token(user.id, expires_at)
+            db.session.commit()
+        else:
+            # Generate session token
+            session_token = generate_session_token()
+            
+            # Create user session
+            user_session = UserSession(
+                user_id=user.id,
+                session_token=session_token,
+                expires_at=expires_at
+            )
+            
+            db.session.add(user_session)
+            db.session.flush()
+            
+            # Keep at most MAX_SESSIONS_PER_USER live sessions, the oldest are logged out
+            enforce_session_cap(user.id, current_app.config.get('MAX_SESSIONS_PER_USER', 10))
+            db.session.commit()
         
         return jsonify({
             'success': True,
@@ -157,6 +216,10 @@ def login():
             'expires_at': expires_at.isoformat()
         }), 200
         
+    except HasherBusy as e:
+        db.session.rollback()
+        return hasher_busy_response(e)
+        
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -169,20 +232,27 @@ def logout():
     """User logout endpoint"""
     try:
         # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
+        token = get_bearer_token()
+        if not token:
             return jsonify({
                 'success': False,
                 'message': 'Token tidak valid'
             }), 401
         
-        token = auth_header.split(' ')[1]
-        
-        # Find and delete session
-        session = UserSession.query.filter_by(session_token=token).first()
-        if session:
-            db.session.delete(session)
-            db.session.commit()
+        if is_signed_token(token):
+            # Signed tokens cannot be deleted, put them on the revocation list
+            claims = decode_token(token)
+            if claims:
+                revocation = revocations.revoke_token(claims)
+                db.session.commit()
+                revocations.confirm(revocation)
+        else:
+            # Find and delete session
+            session = UserSession.query.filter_by(session_token=token).first()
+            if session:
+                db.session.delete(session)
+                db.session.commit()
+        invalidate_token(token)
         
         return jsonify({
             'success': True,
@@ -201,36 +271,24 @@ def verify_token():
     """Verify session token"""
     try:
         # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
+        token = get_bearer_token()
+        if not token:
             return jsonify({
                 'success': False,
                 'message': 'Token tidak valid'
             }), 401
         
-        token = auth_header.split(' ')[1]
-        
-        # Find session
-        session = UserSession.query.filter_by(session_token=token).first()
+        # Find session (cached), together with a snapshot of its user
+        resolved = resolve_session(token)
         
-        if not session:
+        if not resolved:
             return jsonify({
                 'success': False,
-                'message': 'Token tidak ditemukan'
-            }), 401
-        
-        if session.is_expired():
-            # Delete expired session
-            db.session.delete(session)
-            db.session.commit()
-            return jsonify({
-                'success': False,
-                'message': 'Token telah expired'
+                'message': 'Token tidak valid atau expired'
             }), 401
         
-        # Get user
-        user = User.query.get(session.user_id)
-        if not user or not user.is_active:
+        user, expires_at = resolved
+        if not user.is_active:
             return jsonify({
                 'success': False,
                 'message': 'User tidak valid'
@@ -239,7 +297,7 @@ def verify_token():
         return jsonify({
             'success': True,
             'user': user.to_public_dict(),
-            'expires_at': session.expires_at.isoformat()
+            'expires_at': expires_at.isoformat()
         }), 200
         
     except Exception as e:
@@ -249,39 +307,13 @@ def verify_token():
         }), 500
 
 @auth_bp.route('/profile', methods=['GET'])
+@login_required
 def get_profile():
     """Get user profile"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        
-        # Find session
-        session = UserSession.query.filter_by(session_token=token).first()
-        
-        if not session or session.is_expired():
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid atau expired'
-            }), 401
-        
-        # Get user
-        user = User.query.get(session.user_id)
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak ditemukan'
-            }), 404
-        
         return jsonify({
             'success': True,
-            'user': user.to_dict()
+            'user': g.current_user.to_dict()
         }), 200
         
     except Exception as e:
@@ -291,30 +323,12 @@ def get_profile():
         }), 500
 
 @auth_bp.route('/profile', methods=['PUT'])
+@login_required
 def update_profile():
     """Update user profile"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        
-        # Find session
-        session = UserSession.query.filter_by(session_token=token).first()
-        
-        if not session or session.is_expired():
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid atau expired'
-            }), 401
-        
-        # Get user
-        user = User.query.get(session.user_id)
+        # Get user, the snapshot is read-only
+        user = User.query.get(g.current_user.id)
         if not user:
             return jsonify({
                 'success': False,
@@ -351,6 +365,7 @@ def update_profile():
         
         user.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_user(user.id)
         
         return jsonify({
             'success': True,
@@ -366,30 +381,13 @@ def update_profile():
         }), 500
 
 @auth_bp.route('/change-password', methods=['POST'])
+@login_required
+@rate_limit('auth.change_password', per_ip='10/minute', per_user='5/minute')
 def change_password():
     """Change user password"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        
-        # Find session
-        session = UserSession.query.filter_by(session_token=token).first()
-        
-        if not session or session.is_expired():
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid atau expired'
-            }), 401
-        
-        # Get user
-        user = User.query.get(session.user_id)
+        # Get user, the snapshot is read-only
+        user = User.query.get(g.current_user.id)
         if not user:
             return jsonify({
                 'success': False,
@@ -409,7 +407,7 @@ def change_password():
         new_password = data['new_password']
         
         # Check current password
-        if not user.check_password(current_password):
+        if not password_hasher.verify(user.password_hash, current_password):
             return jsonify({
                 'success': False,
                 'message': 'Password lama salah'
@@ -423,15 +421,31 @@ def change_password():
                 'message': password_message
             }), 400
         
-        # Update password
-        user.set_password(new_password)
+        # Update password, signed tokens issued so far stop working
+        user.password_hash = password_hasher.hash(new_password)
         user.updated_at = datetime.utcnow()
+        revocation = None
+        if current_app.config.get('AUTH_TOKEN_MODE', 'opaque') == 'signed':
+            revocation = revocations.revoke_user(user.id)
         db.session.commit()
+        if revocation is not None:
+            revocations.confirm(revocation)
+        invalidate_user(user.id)
         
-        return jsonify({
+        response = {
             'success': True,
             'message': 'Password berhasil diubah'
-        }), 200
+        }
+        
+        # Keep the caller signed in with a fresh signed token
+        if is_signed_token(g.session_token):
+            response['token'] = issue_token(user.id, g.session_expires_at)
+        
+        return jsonify(response), 200
+        
+    except HasherBusy as e:
+        db.session.rollback()
+        return hasher_busy_response(e)
         
     except Exception as e:
         db.session.rollback()
@@ -440,3 +454,36 @@ def change_password():
             'message': 'Terjadi kesalahan server'
         }), 500
 
+@auth_bp.route('/session-metrics', methods=['GET'])
+@login_required
+def get_session_metrics():
+    """Get session purge counters and user_sessions table size"""
+    try:
+        metrics = session_metrics.to_dict()
+        metrics.update(count_cache.get_or_set('session_table_stats', session_table_stats))
+        
+        return jsonify({
+            'success': True,
+            'metrics': metrics
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Terjadi kesalahan server'
+        }), 500
+
+@auth_bp.cli.command('purge-sessions')
+@click.option('--batch-size', type=int, default=1000, help='Rows deleted per transaction')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches')
+def purge_sessions_command(batch_size, max_batches):
+    """Delete expired user sessions and token revocations"""
+    count = purge_expired_sessions(batch_size, max_batches)
+    click.echo(f'{count} sesi expired dihapus')
+
+@auth_bp.cli.command('calibrate-hasher')
+@click.option('--target', type=float, default=TARGET_HASH_SECONDS, help='Seconds one hash should take')
+def calibrate_hasher_command(target):
+    """Propose PASSWORD_HASH_ITERATIONS for this machine"""
+    iterations = password_hasher.calibrate(target, current_app.config.get('PASSWORD_HASH_MIN_ITERATIONS'))
+    click.echo(f'PASSWORD_HASH_ITERATIONS = {iterations} (sekarang {password_hasher.iterations})')
@@ -0,0 +1,22 @@
+from src.models.user import db
+from datetime import datetime
+
+class TokenRevocation(db.Model):
+    """Revoked signed session tokens.
+
+    A row either revokes one token (jti, from logout) or every token of a
+    user issued before not_before (milliseconds since the epoch, from a
+    password change or deactivation). Rows are only needed until the tokens
+    they cover have expired, see expires_at.
+    """
+    __tablename__ = 'token_revocations'
+    __table_args__ = (
+        db.Index('idx_token_revocations_expires', 'expires_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(64))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    not_before = db.Column(db.BigInteger)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,258 @@
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+
+_HOUSE_NUMBER = re.compile(r'\s*\bno\.?\s*\d.*$', re.IGNORECASE)
+
+def normalize_text(value):
+    """Lowercase, strip diacritics and punctuation: 'Jl. Kemang Raya' -> 'jl kemang raya'"""
+    value = unicodedata.normalize('NFKD', str(value or ''))
+    value = ''.join(char for char in value if not unicodedata.combining(char)).lower()
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', value).split())
+
+def split_address(address):
+    """Get (street, [districts]) from an address like 'Jl. Sudirman No. 123, Jakarta Pusat'"""
+    parts = [part.strip() for part in str(address or '').split(',') if part.strip()]
+    if not parts:
+        return None, []
+    street = _HOUSE_NUMBER.sub('', parts[0]).strip() or None
+    return street, parts[1:]
+
+def location_weight(rating, total_reviews):
+    """Rank weight of a location: rating, damped by how many reviews back it"""
+    return float(rating or 0) * math.log1p(total_reviews or 0) + float(rating or 0)
+
+class SuggestionTrie:
+    """Prefix trie over shop names, streets and districts.
+
+    Every node keeps the top-N suggestions of its subtree by weight, so a
+    lookup is a walk down the prefix and a slice; no subtree traversal per
+    keystroke. Phrases are also indexed from every word, so 'kemang' finds
+    'Ban Center Kemang'. Writes only re-rank the nodes on the paths of the
+    phrases they touch.
+    """
+
+    def __init__(self, top_n=10):
+        self.top_n = top_n
+        # node = (children, own entry keys, top entry keys)
+        self._root = ({}, set(), [])
+        self._entries = {}
+        self._locations = {}
+
+    def _node_paths(self, text):
+        """Get the root-to-leaf node lists of every word suffix of a phrase"""
+        words = normalize_text(text).split()
+        paths = []
+        for start in range(len(words)):
+            node = self._root
+            path = [node]
+            for char in ' '.join(words[start:]):
+                node = node[0].setdefault(char, ({}, set(), []))
+                path.append(node)
+            paths.append(path)
+        return paths
+
+    def _rank(self, node):
+        candidates = set(node[1])
+        for child in node[0].values():
+            candidates.update(child[2])
+        node[2][:] = heapq.nlargest(self.top_n, candidates, key=lambda key: (self._entries[key]['weight'], str(key)))
+
+    def _change_entry(self, key, text, kind, weight, count, location_id=None):
+        """Add weight/count to an entry (negative to remove) and re-rank its paths"""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = {'text': text, 'type': kind, 'location_id': location_id, 'weight': 0.0, 'count': 0}
+            self._entries[key] = entry
+
+        entry['weight'] += weight
+        entry['count'] += count
+        if kind == 'location':
+            entry['text'] = text
+
+        paths = self._node_paths(entry['text'])
+        removed = entry['count'] <= 0
+        for path in paths:
+            if removed:
+                path[-1][1].discard(key)
+            else:
+                path[-1][1].add(key)
+
+        # Re-rank bottom-up; a removed entry must leave the rankings before it is dropped
+        if removed:
+            entry['weight'] = float('-inf')
+        for path in paths:
+            for node in reversed(path):
+                self._rank(node)
+        if removed:
+            del self._entries[key]
+
+    def upsert(self, location_id, name, address, rating, total_reviews):
+        """Add or replace one location"""
+        self.remove(location_id)
+
+        weight = location_weight(rating, total_reviews)
+        street, districts = split_address(address)
+        self._locations[location_id] = (name, street, districts, weight)
+
+        self._change_entry(('location', location_id), name, 'location', weight, 1, location_id)
+        if street:
+            self._change_entry(('street', normalize_text(street)), street, 'street', weight, 1)
+        for district in districts:
+            self._change_entry(('district', normalize_text(district)), district, 'district', weight, 1)
+
+    def remove(self, location_id):
+        """Remove one location and its contribution to streets and districts"""
+        previous = self._locations.pop(location_id, None)
+        if previous is None:
+            return
+
+        name, street, districts, weight = previous
+        self._change_entry(('location', location_id), name, 'location', -weight, -1, location_id)
+        if street:
+            self._change_entry(('street', normalize_text(street)), street, 'street', -weight, -1)
+        for district in districts:
+            self._change_entry(('district', normalize_text(district)), district, 'district', -weight, -1)
+
+    def build(self, rows):
+        """Build from (location_id, name, address, rating, total_reviews) rows"""
+        self._root = ({}, set(), [])
+        self._entries = {}
+        self._locations = {}
+
+        for location_id, name, address, rating, total_reviews in rows:
+            weight = location_weight(rating, total_reviews)
+            street, districts = split_address(address)
+            self._locations[location_id] = (name, street, districts, weight)
+
+            keyed = [(('location', location_id), name, 'location', location_id)]
+            if street:
+                keyed.append((('street', normalize_text(street)), street, 'street', None))
+            keyed.extend((('district', normalize_text(district)), district, 'district', None) for district in districts)
+
+            for key, text, kind, entry_location_id in keyed:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = {'text': text, 'type': kind, 'location_id': entry_location_id, 'weight': 0.0, 'count': 0}
+                    self._entries[key] = entry
+                    for path in self._node_paths(text):
+                        path[-1][1].add(key)
+                entry['weight'] += weight
+                entry['count'] += 1
+
+        # Rank every node once, children before parents
+        stack = [(self._root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if children_done:
+                self._rank(node)
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node[0].values())
+
+    def suggest(self, prefix, limit=8):
+        """Get the best suggestions starting with a prefix at a word boundary"""
+        node = self._root
+        for char in normalize_text(prefix):
+            node = node[0].get(char)
+            if node is None:
+                return []
+
+        return [
+            {key: value for key, value in self._entries[entry_key].items() if key != 'weight'}
+            for entry_key in node[2][:limit]
+        ]
+
+# A failed background build is retried after this many seconds
+BUILD_RETRY_SECONDS = 30
+
+class SuggestionIndex:
+    """Thread-safe holder of the suggestion trie, built in the background and patched by writes
+
+    Until the first build has finished suggest() returns nothing instead of
+    making requests wait for it; a stale trie keeps serving while its
+    replacement is built. Writes made during a build are replayed on the
+    new trie before it is swapped in.
+    """
+
+    def __init__(self, top_n=10, timer=time.monotonic):
+        self.top_n = top_n
+        self._timer = timer
+        self._trie = None
+        self._built_at = None
+        self._pending = None
+        self._generation = 0
+        self._retry_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._trie is not None
+
+    def is_fresh(self, max_age):
+        """Check whether the trie was built less than max_age seconds ago"""
+        with self._lock:
+            return self._built_at is not None and self._timer() - self._built_at < max_age
+
+    def clear(self):
+        """Drop the trie, a build already running is discarded"""
+        with self._lock:
+            self._trie = None
+            self._built_at = None
+            self._generation += 1
+
+    def _write(self, method, *args):
+        with self._lock:
+            if self._trie is not None:
+                getattr(self._trie, method)(*args)
+            if self._pending is not None:
+                self._pending.append((method, args))
+
+    def upsert(self, location_id, name, address, rating, total_reviews):
+        self._write('upsert', location_id, name, address, rating, total_reviews)
+
+    def remove(self, location_id):
+        self._write('remove', location_id)
+
+    def start_build(self, load_rows):
+        """Build a new trie from load_rows() on a daemon thread, returns whether one was started
+
+        Nothing happens while a build runs or shortly after one failed.
+        """
+        with self._lock:
+            if self._pending is not None or self._retry_at is not None and self._timer() < self._retry_at:
+                return False
+            self._pending = []
+            generation = self._generation
+
+        threading.Thread(target=self._build, args=(load_rows, generation), name='suggestion-trie', daemon=True).start()
+        return True
+
+    def _build(self, load_rows, generation):
+        trie = None
+        try:
+            trie = SuggestionTrie(self.top_n)
+            trie.build(load_rows())
+        except Exception:
+            trie = None
+        finally:
+            with self._lock:
+                pending, self._pending = self._pending, None
+                if trie is None:
+                    self._retry_at = self._timer() + BUILD_RETRY_SECONDS
+                elif generation == self._generation:
+                    for method, args in pending:
+                        getattr(trie, method)(*args)
+                    self._trie = trie
+                    self._built_at = self._timer()
+                    self._retry_at = None
+
+    def suggest(self, prefix, limit):
+        """Get suggestions from the current trie, none before the first build has finished"""
+        with self._lock:
+            return self._trie.suggest(prefix, limit) if self._trie is not None else []
+
+suggestion_index = SuggestionIndex()
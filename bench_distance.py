@@ -0,0 +1,77 @@
+import os
+import sys
+# Same import layout as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import random
+import time
+
+from src.routes.geo_index import calculate_distance, haversine_many, top_k, np
+
+# Rough bounding box of Java
+MIN_LAT, MAX_LAT = -8.8, -5.9
+MIN_LNG, MAX_LNG = 105.1, 114.6
+
+def generate_locations(count, seed=42):
+    """Generate random (id, latitude, longitude) tuples across Java"""
+    rng = random.Random(seed)
+    return [
+        (location_id, rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LNG, MAX_LNG))
+        for location_id in range(1, count + 1)
+    ]
+
+def loop_nearest(locations, latitude, longitude, radius, limit):
+    """Current per-row search: scalar distance, rounded dict per location, sort, slice"""
+    results = []
+    for location_id, location_lat, location_lng in locations:
+        distance = calculate_distance(latitude, longitude, location_lat, location_lng)
+        if distance <= radius:
+            results.append({'id': location_id, 'distance': round(distance, 2)})
+
+    results.sort(key=lambda x: x['distance'])
+    return results[:limit]
+
+def vectorized_nearest(arrays, latitude, longitude, radius, limit):
+    """One vectorized pass over contiguous arrays plus argpartition top-k"""
+    ids, lat_rad, lng_rad, cos_lat = arrays
+    distances = haversine_many(latitude, longitude, lat_rad, lng_rad, cos_lat)
+    inside = np.flatnonzero(distances <= radius)
+    selected = inside[top_k(distances[inside], min(limit, len(inside)))]
+    return [{'id': location_id, 'distance': round(distance, 2)}
+            for location_id, distance in zip(ids[selected].tolist(), distances[selected].tolist())]
+
+def timeit(func, repeat):
+    """Get the best wall time in milliseconds over repeat runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    if np is None:
+        print('NumPy tidak terpasang, benchmark vectorized dilewati')
+        return
+
+    latitude, longitude = -6.2088, 106.8456
+    radius, limit = 25, 20
+
+    print(f"{'locations':>10} {'loop (ms)':>12} {'numpy (ms)':>12} {'speedup':>9}")
+    for count in (1000, 10000, 100000):
+        locations = generate_locations(count)
+        lat_rad = np.radians(np.array([location[1] for location in locations], dtype=np.float64))
+        lng_rad = np.radians(np.array([location[2] for location in locations], dtype=np.float64))
+        arrays = (np.array([location[0] for location in locations]), lat_rad, lng_rad, np.cos(lat_rad))
+
+        expected = loop_nearest(locations, latitude, longitude, radius, limit)
+        actual = vectorized_nearest(arrays, latitude, longitude, radius, limit)
+        assert [row['distance'] for row in expected] == [row['distance'] for row in actual]
+
+        repeat = 5 if count >= 100000 else 20
+        loop_ms = timeit(lambda: loop_nearest(locations, latitude, longitude, radius, limit), repeat)
+        numpy_ms = timeit(lambda: vectorized_nearest(arrays, latitude, longitude, radius, limit), repeat)
+        print(f'{count:>10} {loop_ms:>12.3f} {numpy_ms:>12.3f} {loop_ms / numpy_ms:>8.1f}x')
+
+if __name__ == '__main__':
+    main()
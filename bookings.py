@@ -1,20 +1,14 @@
-from flask import Blueprint, jsonify, request
-from src.models.user import Booking, TambalLocation, UserSession, Payment, db
+from flask import Blueprint, jsonify, request, g
+from src.models.user import Booking, TambalLocation, Payment, db
+from src.models.location_models import LocationPopularity
+from src.routes.pagination import cursor_page_response, keyset_index
+from src.routes.session_auth import login_required
 from datetime import datetime, timedelta
 import secrets
 
 bookings_bp = Blueprint('bookings', __name__)
 
-def get_current_user(token):
-    """Get current user from token"""
-    if not token:
-        return None
-    
-    session = UserSession.query.filter_by(session_token=token).first()
-    if not session or session.is_expired():
-        return None
-    
-    return session.user
+keyset_index('idx_bookings_user_created', Booking, Booking.user_id)
 
 def generate_booking_id():
     """Generate unique booking ID"""
@@ -47,25 +41,11 @@ def calculate_service_price(service_type, service_description):
     return 25000  # Default price
 
 @bookings_bp.route('/', methods=['POST'])
+@login_required
 def create_booking():
     """Create new booking"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
         data = request.get_json()
         
@@ -132,6 +112,7 @@ def create_booking():
         )
         
         db.session.add(booking)
+        LocationPopularity.record(location_id, LocationPopularity.BOOKING_CREATED)
         db.session.commit()
         
         # Generate booking ID after commit to get the actual ID
@@ -153,25 +134,11 @@ def create_booking():
         }), 500
 
 @bookings_bp.route('/', methods=['GET'])
+@login_required
 def get_user_bookings():
     """Get user's bookings"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
         # Get query parameters
         status = request.args.get('status')
@@ -184,6 +151,10 @@ def get_user_bookings():
         if status:
             query = query.filter_by(status=status)
         
+        # Keyset pagination when a cursor parameter is sent (empty for the first page)
+        if 'cursor' in request.args:
+            return cursor_page_response(query, Booking, limit, 'bookings', ('bookings', user.id, status))
+        
         # Get total count
         total = query.count()
         
@@ -208,25 +179,11 @@ def get_user_bookings():
         }), 500
 
 @bookings_bp.route('/<int:booking_id>', methods=['GET'])
+@login_required
 def get_booking(booking_id):
     """Get specific booking details"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
         # Get booking
         booking = Booking.query.filter_by(id=booking_id, user_id=user.id).first()
@@ -257,25 +214,11 @@ def get_booking(booking_id):
         }), 500
 
 @bookings_bp.route('/<int:booking_id>', methods=['PUT'])
+@login_required
 def update_booking(booking_id):
     """Update booking status"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
         # Get booking
         booking = Booking.query.filter_by(id=booking_id, user_id=user.id).first()
@@ -338,25 +281,11 @@ def update_booking(booking_id):
         }), 500
 
 @bookings_bp.route('/<int:booking_id>/cancel', methods=['POST'])
+@login_required
 def cancel_booking(booking_id):
     """Cancel booking"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
         # Get booking
         booking = Booking.query.filter_by(id=booking_id, user_id=user.id).first()
@@ -414,25 +343,11 @@ def cancel_booking(booking_id):
         }), 500
 
 @bookings_bp.route('/stats', methods=['GET'])
+@login_required
 def get_booking_stats():
     """Get user's booking statistics"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
         # Get booking statistics
         total_bookings = Booking.query.filter_by(user_id=user.id).count()
@@ -463,25 +378,11 @@ def get_booking_stats():
         }), 500
 
 @bookings_bp.route('/upcoming', methods=['GET'])
+@login_required
 def get_upcoming_bookings():
     """Get user's upcoming bookings"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
         # Get upcoming bookings
         upcoming_bookings = Booking.query.filter(
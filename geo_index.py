@@ -0,0 +1,380 @@
+import math
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+# Radius of earth in kilometers
+EARTH_RADIUS_KM = 6371
+
+# Length of one degree of latitude in kilometers
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+# Distance matrices are computed in row blocks of at most this many cells
+MAX_MATRIX_CELLS = 2000000
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Calculate distance between two points using Haversine formula"""
+    # Convert latitude and longitude from degrees to radians
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+
+    # Haversine formula
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+
+    return c * EARTH_RADIUS_KM
+
+def haversine_many(latitude, longitude, lat_rad, lng_rad, cos_lat):
+    """Vectorized Haversine distance from one point to arrays of points (radians)"""
+    lat1 = math.radians(latitude)
+    lon1 = math.radians(longitude)
+
+    a = np.sin((lat_rad - lat1) / 2) ** 2 + math.cos(lat1) * cos_lat * np.sin((lng_rad - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def haversine_matrix(latitudes, longitudes, lat_rad, lng_rad, cos_lat):
+    """Vectorized Haversine distances from several points to arrays of points, shape (queries, points)"""
+    query_lat = np.radians(np.asarray(latitudes, dtype=np.float64))[:, np.newaxis]
+    query_lng = np.radians(np.asarray(longitudes, dtype=np.float64))[:, np.newaxis]
+
+    a = np.sin((lat_rad - query_lat) / 2) ** 2 + np.cos(query_lat) * cos_lat * np.sin((lng_rad - query_lng) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def top_k(distances, k):
+    """Get positions of the k smallest distances, nearest first"""
+    if k < len(distances):
+        positions = np.argpartition(distances, k - 1)[:k]
+    else:
+        positions = np.arange(len(distances))
+    return positions[np.argsort(distances[positions], kind='stable')]
+
+def bounding_box(latitude, longitude, radius):
+    """Get (min_lat, max_lat, min_lng, max_lng) enclosing a radius in km"""
+    dlat = radius / KM_PER_DEGREE
+    min_lat = max(latitude - dlat, -90.0)
+    max_lat = min(latitude + dlat, 90.0)
+
+    # Longitude degrees shrink towards the poles, use the widest latitude in the box
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat < 1e-6:
+        return min_lat, max_lat, -180.0, 180.0
+
+    dlng = min(dlat / cos_lat, 180.0)
+    return min_lat, max_lat, longitude - dlng, longitude + dlng
+
+class PointSet:
+    """Fixed batch of (location_id, latitude, longitude) for repeated distance queries"""
+
+    def __init__(self, points):
+        points = [(location_id, float(latitude), float(longitude)) for location_id, latitude, longitude in points]
+        self.ids = [point[0] for point in points]
+
+        if np is None:
+            self._points = points
+        else:
+            lat_rad = np.radians(np.array([point[1] for point in points], dtype=np.float64))
+            self._ids = np.array(self.ids)
+            self._lat_rad = lat_rad
+            self._lng_rad = np.radians(np.array([point[2] for point in points], dtype=np.float64))
+            self._cos_lat = np.cos(lat_rad)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def within_radius(self, latitude, longitude, radius, k=None):
+        """Get [(location_id, distance_km)] within radius, nearest first, at most k"""
+        if not self.ids:
+            return []
+
+        if np is None:
+            hits = []
+            for location_id, point_lat, point_lng in self._points:
+                distance = calculate_distance(latitude, longitude, point_lat, point_lng)
+                if distance <= radius:
+                    hits.append((location_id, distance))
+
+            hits.sort(key=lambda hit: hit[1])
+            return hits if k is None else hits[:k]
+
+        distances = haversine_many(latitude, longitude, self._lat_rad, self._lng_rad, self._cos_lat)
+        return self._select(distances, radius, k)
+
+    def _select(self, distances, radius, k):
+        if k is not None and k <= 0:
+            return []
+        inside = np.flatnonzero(distances <= radius)
+        selected = inside[top_k(distances[inside], len(inside) if k is None else k)]
+        return list(zip(self._ids[selected].tolist(), distances[selected].tolist()))
+
+    def nearest_many(self, queries):
+        """Answer [(latitude, longitude, radius, k)] queries with one distance matrix per row block"""
+        if np is None or not self.ids:
+            return [self.within_radius(latitude, longitude, radius, k) for latitude, longitude, radius, k in queries]
+
+        results = []
+        rows = max(1, MAX_MATRIX_CELLS // len(self.ids))
+        for start in range(0, len(queries), rows):
+            block = queries[start:start + rows]
+            matrix = haversine_matrix([query[0] for query in block], [query[1] for query in block],
+                                      self._lat_rad, self._lng_rad, self._cos_lat)
+            results.extend(self._select(matrix[row], radius, k) for row, (_, _, radius, k) in enumerate(block))
+        return results
+
+class LocationIndex:
+    """In-process grid index over the coordinates of active locations.
+
+    Points are bucketed into square cells of ``cell_size`` degrees so radius
+    and k-nearest queries only visit the cells overlapping the query instead
+    of every location. The index is loaded lazily and patched by the write
+    endpoints; each worker process keeps its own copy, so it is reloaded
+    once older than a maximum age to pick up other processes' writes.
+    Points with non-finite coordinates are left out.
+
+    When NumPy is installed, coordinates are also kept in contiguous float64
+    arrays so the distances of all candidates are computed in one vectorized
+    pass; ``calculate_distance`` is the scalar fallback.
+    """
+
+    def __init__(self, cell_size=0.05, timer=time.monotonic):
+        self.cell_size = cell_size
+        self._timer = timer
+        self._points = {}
+        self._cells = {}
+        self._arrays = None
+        self._lock = threading.RLock()
+        self._loaded_at = None
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def is_fresh(self, max_age):
+        """Check whether the index was loaded less than max_age seconds ago"""
+        loaded_at = self._loaded_at
+        return loaded_at is not None and self._timer() - loaded_at < max_age
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell(self, latitude, longitude):
+        return (int(math.floor(latitude / self.cell_size)),
+                int(math.floor(longitude / self.cell_size)))
+
+    def load(self, points):
+        """Replace index content with (location_id, latitude, longitude) tuples"""
+        with self._lock:
+            self._points = {}
+            self._cells = {}
+            self._arrays = None
+            for location_id, latitude, longitude in points:
+                self._insert(location_id, latitude, longitude)
+            self._loaded_at = self._timer()
+
+    def clear(self):
+        """Drop all points so the next query reloads the index"""
+        with self._lock:
+            self._points = {}
+            self._cells = {}
+            self._arrays = None
+            self._loaded_at = None
+
+    def _insert(self, location_id, latitude, longitude):
+        try:
+            latitude, longitude = float(latitude), float(longitude)
+        except (TypeError, ValueError):
+            return
+        if not (math.isfinite(latitude) and math.isfinite(longitude)):
+            return
+
+        self._arrays = None
+        self._points[location_id] = (latitude, longitude)
+        self._cells.setdefault(self._cell(latitude, longitude), set()).add(location_id)
+
+    def upsert(self, location_id, latitude, longitude):
+        """Add a location or move it to new coordinates"""
+        with self._lock:
+            self._remove(location_id)
+            self._insert(location_id, latitude, longitude)
+
+    def remove(self, location_id):
+        """Remove a location (e.g. after it has been deactivated)"""
+        with self._lock:
+            self._remove(location_id)
+
+    def _remove(self, location_id):
+        point = self._points.pop(location_id, None)
+        if point is None:
+            return
+
+        self._arrays = None
+        cell = self._cell(*point)
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(location_id)
+            if not members:
+                del self._cells[cell]
+
+    def _candidates(self, latitude, longitude, radius):
+        """Get ids of points inside the cells overlapping the radius box"""
+        if not (math.isfinite(latitude) and math.isfinite(longitude) and radius >= 0):
+            return []
+
+        min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius)
+
+        # Boxes crossing the antimeridian are rare here, scan everything instead
+        if min_lng < -180.0 or max_lng > 180.0:
+            return list(self._points)
+
+        min_row, min_col = self._cell(min_lat, min_lng)
+        max_row, max_col = self._cell(max_lat, max_lng)
+
+        # Huge radius: walking empty cells would cost more than a full scan
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+            return [
+                location_id
+                for cell, members in self._cells.items()
+                if min_row <= cell[0] <= max_row and min_col <= cell[1] <= max_col
+                for location_id in members
+            ]
+
+        candidates = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                members = self._cells.get((row, col))
+                if members:
+                    candidates.extend(members)
+        return candidates
+
+    def _get_arrays(self):
+        """Get (positions, ids, lat_rad, lng_rad, cos_lat), rebuilt after writes"""
+        if self._arrays is None:
+            ids = list(self._points)
+            coordinates = np.array([self._points[location_id] for location_id in ids], dtype=np.float64).reshape(-1, 2)
+            lat_rad = np.ascontiguousarray(np.radians(coordinates[:, 0]))
+            lng_rad = np.ascontiguousarray(np.radians(coordinates[:, 1]))
+            self._arrays = (
+                {location_id: position for position, location_id in enumerate(ids)},
+                np.array(ids),
+                lat_rad,
+                lng_rad,
+                np.cos(lat_rad)
+            )
+        return self._arrays
+
+    def candidate_points(self, latitude, longitude, radius):
+        """Get [(location_id, latitude, longitude)] from the cells overlapping a radius"""
+        with self._lock:
+            return [
+                (location_id,) + self._points[location_id]
+                for location_id in self._candidates(latitude, longitude, radius)
+            ]
+
+    def _search(self, latitude, longitude, radius, k=None):
+        """Get [(location_id, distance_km)] within radius, nearest first, at most k"""
+        candidates = self._candidates(latitude, longitude, radius)
+        if not candidates:
+            return []
+
+        if np is None:
+            hits = []
+            for location_id in candidates:
+                point_lat, point_lng = self._points[location_id]
+                distance = calculate_distance(latitude, longitude, point_lat, point_lng)
+                if distance <= radius:
+                    hits.append((location_id, distance))
+
+            hits.sort(key=lambda hit: hit[1])
+            return hits if k is None else hits[:k]
+
+        positions, ids, lat_rad, lng_rad, cos_lat = self._get_arrays()
+        if len(candidates) < len(ids):
+            selected = np.fromiter((positions[location_id] for location_id in candidates),
+                                   dtype=np.intp, count=len(candidates))
+            ids, lat_rad, lng_rad, cos_lat = ids[selected], lat_rad[selected], lng_rad[selected], cos_lat[selected]
+
+        distances = haversine_many(latitude, longitude, lat_rad, lng_rad, cos_lat)
+        inside = np.flatnonzero(distances <= radius)
+        order = top_k(distances[inside], len(inside) if k is None else k)
+        selected = inside[order]
+        return list(zip(ids[selected].tolist(), distances[selected].tolist()))
+
+    def within_radius(self, latitude, longitude, radius):
+        """Get [(location_id, distance_km)] within radius, nearest first"""
+        with self._lock:
+            return self._search(latitude, longitude, radius)
+
+    def nearest(self, latitude, longitude, k, radius=None):
+        """Get the k nearest [(location_id, distance_km)], optionally capped by radius"""
+        with self._lock:
+            if k <= 0 or not self._points:
+                return []
+
+            max_radius = radius if radius is not None else math.pi * EARTH_RADIUS_KM
+            search_radius = min(self.cell_size * KM_PER_DEGREE, max_radius)
+
+            # Everything outside the search radius is farther than everything inside,
+            # so once k points are found the answer is exact.
+            while True:
+                hits = self._search(latitude, longitude, search_radius, k)
+                if len(hits) >= k or search_radius >= max_radius:
+                    return hits[:k]
+                search_radius = min(search_radius * 2, max_radius)
+
+    def nearest_each(self, queries, k, radius=None):
+        """Get the k nearest [(location_id, distance_km)] of many (latitude, longitude) queries
+
+        Queries falling in the same cell share one distance matrix against
+        the 3x3 cells around it. A result is only kept when its k-th hit is
+        closer than the edge of that block; the others go through nearest().
+        """
+        with self._lock:
+            if np is None or k <= 0 or not self._points:
+                return [self.nearest(latitude, longitude, k, radius) for latitude, longitude in queries]
+
+            positions, ids, lat_rad, lng_rad, cos_lat = self._get_arrays()
+            max_radius = radius if radius is not None else math.pi * EARTH_RADIUS_KM
+
+            results = [None] * len(queries)
+            groups = {}
+            for number, (latitude, longitude) in enumerate(queries):
+                if math.isfinite(latitude) and math.isfinite(longitude):
+                    groups.setdefault(self._cell(latitude, longitude), []).append(number)
+                else:
+                    results[number] = []
+
+            for (row, col), numbers in groups.items():
+                candidates = [
+                    location_id
+                    for cell_row in range(row - 1, row + 2)
+                    for cell_col in range(col - 1, col + 2)
+                    for location_id in self._cells.get((cell_row, cell_col), ())
+                ]
+
+                # Distance from any point of the middle cell to the block edge
+                widest_lat = max(abs(row * self.cell_size), abs((row + 1) * self.cell_size))
+                safe = self.cell_size * KM_PER_DEGREE * min(1.0, math.cos(math.radians(min(widest_lat + self.cell_size, 90.0))))
+
+                selected = np.fromiter((positions[location_id] for location_id in candidates),
+                                       dtype=np.intp, count=len(candidates))
+                matrix = haversine_matrix(
+                    [queries[number][0] for number in numbers], [queries[number][1] for number in numbers],
+                    lat_rad[selected], lng_rad[selected], cos_lat[selected]
+                )
+
+                for line, number in enumerate(numbers):
+                    distances = matrix[line]
+                    inside = np.flatnonzero(distances <= max_radius)
+                    order = inside[top_k(distances[inside], min(k, len(inside)))]
+                    if len(order) == k and distances[order[-1]] <= safe or max_radius <= safe:
+                        results[number] = list(zip(ids[selected[order]].tolist(), distances[order].tolist()))
+                    else:
+                        results[number] = self.nearest(queries[number][0], queries[number][1], k, radius)
+
+            return results
+
+location_index = LocationIndex()
@@ -0,0 +1,94 @@
+from src.models.user import TambalLocation, db
+from src.routes.cache import TTLCache
+from sqlalchemy import func, cast, Integer
+import math
+
+# Cluster cells per tile side; a 256px map tile gets 32px cells
+CLUSTER_GRID = 8
+
+# From this zoom on the map gets individual locations instead of clusters
+DETAIL_ZOOM = 15
+
+MAX_ZOOM = 21
+
+# Tiles one viewport may touch (a large screen at any zoom needs ~20)
+MAX_VIEWPORT_TILES = 64
+
+# Clusters per (zoom, tile_x, tile_y), cleared on location and review writes
+cluster_cache = TTLCache(maxsize=4096, ttl=600)
+
+def tile_size(zoom):
+    """Get the side in degrees of a map tile at a zoom level"""
+    return 360.0 / (2 ** zoom)
+
+def viewport_tile_range(south, west, north, east, zoom):
+    """Get (min_x, max_x, min_y, max_y) of the tiles covering a viewport"""
+    size = tile_size(zoom)
+    south, north = max(min(south, north), -90.0), min(max(south, north), 90.0)
+    west, east = max(west, -180.0), min(east, 180.0)
+
+    return (int(math.floor((west + 180.0) / size)), int(math.floor((east + 180.0) / size)),
+            int(math.floor((south + 90.0) / size)), int(math.floor((north + 90.0) / size)))
+
+def viewport_tile_count(south, west, north, east, zoom):
+    """Count the tiles covering a viewport without listing them"""
+    min_x, max_x, min_y, max_y = viewport_tile_range(south, west, north, east, zoom)
+    return max(0, max_x - min_x + 1) * max(0, max_y - min_y + 1)
+
+def viewport_tiles(south, west, north, east, zoom):
+    """Get the (tile_x, tile_y) keys of the tiles covering a viewport"""
+    min_x, max_x, min_y, max_y = viewport_tile_range(south, west, north, east, zoom)
+    return [(x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+def compute_tile_clusters(zoom, tile_x, tile_y):
+    """Aggregate the active locations of one tile into grid cell clusters.
+
+    The grouping runs in the database over the coordinate index, so a tile
+    costs one query whatever the number of locations it holds.
+    """
+    size = tile_size(zoom)
+    west = tile_x * size - 180.0
+    south = tile_y * size - 90.0
+    cell = size / CLUSTER_GRID
+
+    # Offsets from the tile corner are never negative, so CAST truncation is floor
+    row = cast((TambalLocation.latitude - south) / cell, Integer)
+    col = cast((TambalLocation.longitude - west) / cell, Integer)
+
+    rows = db.session.query(
+        func.count(TambalLocation.id),
+        func.avg(TambalLocation.latitude),
+        func.avg(TambalLocation.longitude),
+        func.max(TambalLocation.rating),
+        func.min(TambalLocation.id)
+    ).filter(
+        TambalLocation.is_active == True,
+        TambalLocation.latitude >= south,
+        TambalLocation.latitude < south + size,
+        TambalLocation.longitude >= west,
+        TambalLocation.longitude < west + size
+    ).group_by(row, col).all()
+
+    clusters = []
+    for count, latitude, longitude, best_rating, first_id in rows:
+        cluster = {
+            'count': count,
+            'latitude': round(float(latitude), 6),
+            'longitude': round(float(longitude), 6),
+            'best_rating': float(best_rating or 0)
+        }
+        if count == 1:
+            cluster['location_id'] = first_id
+        clusters.append(cluster)
+
+    return clusters
+
+def get_viewport_clusters(south, west, north, east, zoom):
+    """Get the clusters of every tile in a viewport, each tile cached separately"""
+    clusters = []
+    for tile_x, tile_y in viewport_tiles(south, west, north, east, zoom):
+        clusters.extend(cluster_cache.get_or_set(
+            (zoom, tile_x, tile_y),
+            lambda: compute_tile_clusters(zoom, tile_x, tile_y)
+        ))
+    return clusters
@@ -0,0 +1,183 @@
+from src.models.user import TambalLocation, db
+from sqlalchemy import text, or_, false
+import re
+
+# SQLite FTS5 table mirroring name/address/description, rowid = tambal_locations.id
+FTS_TABLE = 'tambal_locations_fts'
+
+# MySQL uses the FULLTEXT index declared in schema.sql
+MYSQL_MATCH = 'MATCH(name, address, description)'
+
+MAX_TERMS = 8
+
+_backends = {}
+
+def _tokenize(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+def get_backend():
+    """Get the full-text backend of the current database: 'fts5', 'mysql' or 'like'"""
+    engine = db.engine
+    key = str(engine.url)
+    if key in _backends:
+        return _backends[key]
+
+    dialect = engine.dialect.name
+    if dialect == 'mysql':
+        backend = 'mysql'
+    elif dialect == 'sqlite':
+        backend = 'fts5' if _ensure_fts_table() else 'like'
+    else:
+        backend = 'like'
+
+    _backends[key] = backend
+    return backend
+
+def _ensure_fts_table():
+    """Create the FTS5 table (and fill it) if missing, False when FTS5 is unavailable
+
+    Runs on its own connection so it never commits a request's pending work.
+    """
+    try:
+        with db.engine.begin() as connection:
+            exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE}
+            ).first()
+            if not exists:
+                connection.execute(text(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                    "name, address, description, tokenize = 'unicode61 remove_diacritics 2')"
+                ))
+                _fill_fts_table(connection)
+    except Exception:
+        return False
+
+    return True
+
+def index_location(location):
+    """Sync one location into the full-text index (caller commits)"""
+    if get_backend() != 'fts5':
+        return
+
+    db.session.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': location.id})
+    if location.is_active:
+        db.session.execute(
+            text(f'INSERT INTO {FTS_TABLE} (rowid, name, address, description) VALUES (:id, :name, :address, :description)'),
+            {'id': location.id, 'name': location.name, 'address': location.address, 'description': location.description or ''}
+        )
+
+def rebuild():
+    """Rebuild the full-text index from all active locations, returns row count"""
+    if get_backend() != 'fts5':
+        return 0
+
+    with db.engine.begin() as connection:
+        return _fill_fts_table(connection)
+
+def _fill_fts_table(connection):
+    connection.execute(text(f'DELETE FROM {FTS_TABLE}'))
+    result = connection.execute(text(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, address, description) "
+        "SELECT id, name, address, COALESCE(description, '') FROM tambal_locations WHERE is_active = 1"
+    ))
+    return result.rowcount
+
+# Candidate ids per query, kept below the bound parameter limits of the drivers
+ID_CHUNK_SIZE = 900
+
+def _fts_match(terms):
+    # Any term may match (prefix search), bm25 ranks documents matching more terms first
+    return ' OR '.join(f'"{term}"*' for term in terms)
+
+def _like_conditions(terms):
+    return [
+        or_(TambalLocation.name.ilike(f'%{term}%'),
+            TambalLocation.address.ilike(f'%{term}%'),
+            TambalLocation.description.ilike(f'%{term}%'))
+        for term in terms
+    ]
+
+def match_clause(query):
+    """Get the SQL condition selecting active locations that match a free-text query
+
+    Lets the database filter, sort and count matches itself instead of
+    going through a truncated list of ids.
+    """
+    terms = _tokenize(query)
+    if not terms:
+        return false()
+
+    backend = get_backend()
+
+    if backend == 'fts5':
+        return text(f'tambal_locations.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_match)')\
+            .bindparams(fts_match=_fts_match(terms))
+
+    if backend == 'mysql':
+        return text(f'{MYSQL_MATCH} AGAINST (:fts_query IN NATURAL LANGUAGE MODE)')\
+            .bindparams(fts_query=' '.join(terms))
+
+    return or_(*_like_conditions(terms))
+
+def search(query, limit=None, location_ids=None):
+    """Get [(location_id, score)] matching a free-text query, best first
+
+    location_ids restricts the search to those candidates (e.g. the
+    locations inside a radius), so matches are never lost to better ranked
+    ones elsewhere; limit caps the result after ranking.
+    """
+    terms = _tokenize(query)
+    if not terms:
+        return []
+
+    if location_ids is None:
+        scored = _search_chunk(terms, None)
+    else:
+        location_ids = list(location_ids)
+        scored = []
+        for start in range(0, len(location_ids), ID_CHUNK_SIZE):
+            scored.extend(_search_chunk(terms, location_ids[start:start + ID_CHUNK_SIZE]))
+
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored if limit is None else scored[:limit]
+
+def _search_chunk(terms, location_ids):
+    """Score the matches among location_ids (every location when None), unordered"""
+    if location_ids is not None and not location_ids:
+        return []
+
+    backend = get_backend()
+    params = {}
+    id_filter = ''
+    if location_ids is not None:
+        params.update({f'id_{number}': location_id for number, location_id in enumerate(location_ids)})
+        id_filter = ', '.join(f':id_{number}' for number in range(len(location_ids)))
+
+    if backend == 'fts5':
+        # bm25 uses the statistics of the whole table, so chunked scores stay comparable
+        sql = f'SELECT rowid, bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match'
+        if id_filter:
+            sql += f' AND rowid IN ({id_filter})'
+        rows = db.session.execute(text(sql), dict(params, match=_fts_match(terms))).all()
+        return [(row[0], -row[1]) for row in rows]
+
+    if backend == 'mysql':
+        sql = (f'SELECT id, {MYSQL_MATCH} AGAINST (:query IN NATURAL LANGUAGE MODE) '
+               f'FROM tambal_locations WHERE is_active = 1 AND {MYSQL_MATCH} AGAINST (:query IN NATURAL LANGUAGE MODE)')
+        if id_filter:
+            sql += f' AND id IN ({id_filter})'
+        rows = db.session.execute(text(sql), dict(params, query=' '.join(terms))).all()
+        return [(row[0], float(row[1])) for row in rows]
+
+    # No full-text support, fall back to LIKE and score by matched terms
+    query = db.session.query(TambalLocation.id, TambalLocation.name, TambalLocation.address, TambalLocation.description)\
+                      .filter(TambalLocation.is_active == True, or_(*_like_conditions(terms)))
+    if location_ids is not None:
+        query = query.filter(TambalLocation.id.in_(location_ids))
+
+    scored = []
+    for location_id, name, address, description in query.all():
+        document = ' '.join([name or '', address or '', description or '']).lower()
+        scored.append((location_id, float(sum(1 for term in terms if term in document))))
+    return scored
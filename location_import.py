@@ -0,0 +1,152 @@
+from src.models.user import TambalLocation, db
+import csv
+import json
+import math
+
+# Same rules as create_location
+REQUIRED_FIELDS = ['name', 'address', 'latitude', 'longitude']
+
+# Columns written by an import, every other column takes its model default
+IMPORT_COLUMNS = ['name', 'address', 'latitude', 'longitude', 'phone', 'email', 'description', 'services', 'operating_hours']
+
+IMPORT_BATCH_SIZE = 500
+
+COORDINATE_RANGES = {'latitude': (-90.0, 90.0), 'longitude': (-180.0, 180.0)}
+
+class ImportRowError(ValueError):
+    """A row that cannot be imported, with its 1-based line number"""
+
+    def __init__(self, line, message):
+        super().__init__(message)
+        self.line = line
+        self.message = message
+
+def validate_location_data(data):
+    """Get the error message for location data, None when valid"""
+    if not isinstance(data, dict):
+        return 'Data lokasi tidak valid'
+
+    for field in REQUIRED_FIELDS:
+        if not data.get(field):
+            return f'{field} harus diisi'
+
+    for field in COORDINATE_RANGES:
+        error = validate_coordinate(field, data[field])
+        if error:
+            return error
+
+    return None
+
+def validate_coordinate(field, value):
+    """Get the error message for a latitude or longitude, None when finite and in range"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return f'{field} tidak valid'
+
+    low, high = COORDINATE_RANGES[field]
+    if not math.isfinite(number) or not low <= number <= high:
+        return f'{field} tidak valid'
+
+    return None
+
+def build_location(data):
+    """Build an unsaved TambalLocation from validated data"""
+    location = TambalLocation(
+        name=str(data['name']).strip(),
+        address=str(data['address']).strip(),
+        latitude=float(data['latitude']),
+        longitude=float(data['longitude']),
+        phone=str(data.get('phone') or '').strip(),
+        email=str(data.get('email') or '').strip(),
+        description=str(data.get('description') or '').strip()
+    )
+
+    if data.get('services'):
+        location.set_services(data['services'])
+
+    if data.get('operating_hours'):
+        location.set_operating_hours(data['operating_hours'])
+
+    return location
+
+def _parse_csv_row(row):
+    """CSV cells are strings: services as JSON or 'a;b', operating_hours as JSON"""
+    data = {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+
+    services = data.get('services')
+    if services:
+        if services.startswith('['):
+            data['services'] = json.loads(services)
+        else:
+            data['services'] = [service.strip() for service in services.replace(';', ',').split(',') if service.strip()]
+
+    if data.get('operating_hours'):
+        data['operating_hours'] = json.loads(data['operating_hours'])
+
+    return data
+
+def iter_import_rows(stream, file_format):
+    """Yield (line, data) from a CSV or JSONL text stream, one row at a time.
+
+    Rows that cannot be parsed are yielded as (line, ImportRowError).
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            try:
+                yield reader.line_num, _parse_csv_row(row)
+            except ValueError:
+                yield reader.line_num, ImportRowError(reader.line_num, 'Format JSON tidak valid')
+        return
+
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            yield line, json.loads(text)
+        except ValueError:
+            yield line, ImportRowError(line, 'Format JSON tidak valid')
+
+def detect_format(filename):
+    """Get 'csv' or 'jsonl' from a file name"""
+    return 'csv' if str(filename or '').lower().endswith('.csv') else 'jsonl'
+
+def import_locations(stream, file_format, batch_size=IMPORT_BATCH_SIZE, on_error=None):
+    """Stream locations from a CSV/JSONL text stream into tambal_locations.
+
+    Valid rows are inserted with one executemany per batch, each batch in
+    its own transaction; invalid rows are passed to on_error(ImportRowError)
+    and skipped. Dependent tables and in-process indexes are not touched,
+    the caller rebuilds them once afterwards. Returns (imported, failed).
+    """
+    table = TambalLocation.__table__
+    batch = []
+    imported = 0
+    failed = 0
+
+    def flush():
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+        batch.clear()
+
+    for line, data in iter_import_rows(stream, file_format):
+        if not isinstance(data, ImportRowError):
+            message = validate_location_data(data)
+            data = ImportRowError(line, message) if message else build_location(data)
+
+        if isinstance(data, ImportRowError):
+            failed += 1
+            if on_error is not None:
+                on_error(data)
+            continue
+
+        batch.append({column: getattr(data, column) for column in IMPORT_COLUMNS})
+        imported += 1
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    return imported, failed
@@ -0,0 +1,295 @@
+from src.models.user import TambalLocation, Review, Booking, db
+from sqlalchemy import func
+from datetime import datetime
+import json
+import math
+
+def normalize_service(service):
+    """Normalize a service name, e.g. 'Ban Tubeless' -> 'ban_tubeless'"""
+    return '_'.join(str(service).strip().lower().replace('-', ' ').split())
+
+def parse_services(services):
+    """Parse the services JSON string stored on TambalLocation"""
+    if not services:
+        return []
+    if isinstance(services, (list, tuple)):
+        return list(services)
+    try:
+        parsed = json.loads(services)
+    except (TypeError, ValueError):
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+class LocationService(db.Model):
+    """Normalized (location, service) pairs backing the service_type filter"""
+    __tablename__ = 'location_services'
+    __table_args__ = (
+        db.Index('idx_location_services_service', 'service', 'location_id'),
+    )
+
+    location_id = db.Column(db.Integer, db.ForeignKey('tambal_locations.id', ondelete='CASCADE'), primary_key=True)
+    service = db.Column(db.String(50), primary_key=True)
+
+    @classmethod
+    def sync(cls, location_id, services):
+        """Replace the service rows of a location (caller commits)"""
+        cls.query.filter_by(location_id=location_id).delete(synchronize_session=False)
+
+        keys = {normalize_service(service) for service in parse_services(services)}
+        for key in sorted(key for key in keys if key):
+            db.session.add(cls(location_id=location_id, service=key))
+
+    @classmethod
+    def location_ids(cls, service):
+        """Get a subquery of location ids offering a service"""
+        return db.session.query(cls.location_id).filter(cls.service == normalize_service(service))
+
+    @classmethod
+    def backfill(cls):
+        """Add the service rows of locations that have none yet (e.g. created before the table existed), returns row count"""
+        indexed = db.session.query(cls.location_id)
+        rows = []
+        for location_id, services in db.session.query(TambalLocation.id, TambalLocation.services)\
+                                               .filter(~TambalLocation.id.in_(indexed)).all():
+            keys = {normalize_service(service) for service in parse_services(services)}
+            rows.extend({'location_id': location_id, 'service': key} for key in keys if key)
+
+        if rows:
+            db.session.execute(cls.__table__.insert(), rows)
+        db.session.commit()
+        return len(rows)
+
+    @classmethod
+    def rebuild(cls):
+        """Rebuild all service rows from TambalLocation.services, returns row count"""
+        cls.query.delete(synchronize_session=False)
+
+        rows = []
+        for location_id, services in db.session.query(TambalLocation.id, TambalLocation.services).all():
+            keys = {normalize_service(service) for service in parse_services(services)}
+            rows.extend({'location_id': location_id, 'service': key} for key in keys if key)
+
+        if rows:
+            db.session.execute(cls.__table__.insert(), rows)
+        db.session.commit()
+        return len(rows)
+
+class LocationRatingStats(db.Model):
+    """Running rating sum, count and 1-5 star histogram per location.
+
+    Updated atomically on review writes so the shop page reads its rating
+    distribution with a single primary key lookup.
+    """
+    __tablename__ = 'location_rating_stats'
+
+    location_id = db.Column(db.Integer, db.ForeignKey('tambal_locations.id', ondelete='CASCADE'), primary_key=True)
+    rating_sum = db.Column(db.Float, nullable=False, default=0)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    star_1 = db.Column(db.Integer, nullable=False, default=0)
+    star_2 = db.Column(db.Integer, nullable=False, default=0)
+    star_3 = db.Column(db.Integer, nullable=False, default=0)
+    star_4 = db.Column(db.Integer, nullable=False, default=0)
+    star_5 = db.Column(db.Integer, nullable=False, default=0)
+
+    def distribution(self):
+        """Get the review count per star as {'1': n, ..., '5': n}"""
+        return {str(star): getattr(self, f'star_{star}') or 0 for star in range(1, 6)}
+
+    @staticmethod
+    def empty_distribution():
+        return {str(star): 0 for star in range(1, 6)}
+
+    @classmethod
+    def add_rating(cls, location, rating):
+        """Add one rating to a location and refresh its rating/total_reviews (caller commits)"""
+        # First review since the stats table existed: carry on from the stored average
+        # (the histogram of older reviews is filled in by recompute). Concurrent first
+        # reviews race on this insert, the loser's is ignored and both updates apply.
+        base_count = location.total_reviews or 0
+        db.session.execute(
+            cls.__table__.insert()
+               .prefix_with('OR IGNORE', dialect='sqlite')
+               .prefix_with('IGNORE', dialect='mysql'),
+            {'location_id': location.id, 'rating_sum': float(location.rating or 0) * base_count, 'review_count': base_count,
+             'star_1': 0, 'star_2': 0, 'star_3': 0, 'star_4': 0, 'star_5': 0}
+        )
+
+        star = getattr(cls, f'star_{rating}')
+        cls.query.filter_by(location_id=location.id).update({
+            cls.rating_sum: cls.rating_sum + rating,
+            cls.review_count: cls.review_count + 1,
+            star: star + 1
+        }, synchronize_session=False)
+
+        rating_sum, review_count = db.session.query(cls.rating_sum, cls.review_count)\
+                                             .filter_by(location_id=location.id)\
+                                             .one()
+
+        location.rating = rating_sum / review_count
+        location.total_reviews = review_count
+        location.updated_at = datetime.utcnow()
+
+    @classmethod
+    def recompute(cls, location_id=None):
+        """Recompute stats and location ratings from the reviews table, returns location count"""
+        query = db.session.query(Review.location_id, func.sum(Review.rating), func.count(Review.id))\
+                          .group_by(Review.location_id)
+        locations = TambalLocation.query
+        if location_id is not None:
+            query = query.filter(Review.location_id == location_id)
+            locations = locations.filter(TambalLocation.id == location_id)
+
+        aggregates = {row[0]: (float(row[1] or 0), row[2]) for row in query.all()}
+
+        histogram_query = db.session.query(Review.location_id, Review.rating, func.count(Review.id))\
+                                    .group_by(Review.location_id, Review.rating)
+        if location_id is not None:
+            histogram_query = histogram_query.filter(Review.location_id == location_id)
+
+        histograms = {}
+        for review_location_id, rating, review_count in histogram_query.all():
+            histograms.setdefault(review_location_id, {})[rating] = review_count
+
+        count = 0
+        for location in locations.all():
+            rating_sum, review_count = aggregates.get(location.id, (0.0, 0))
+
+            stats = cls.query.get(location.id)
+            if stats is None:
+                stats = cls(location_id=location.id)
+                db.session.add(stats)
+            stats.rating_sum = rating_sum
+            stats.review_count = review_count
+            histogram = histograms.get(location.id, {})
+            for star in range(1, 6):
+                setattr(stats, f'star_{star}', histogram.get(star, 0))
+
+            rating = rating_sum / review_count if review_count else 0
+            if (location.rating, location.total_reviews) != (rating, review_count):
+                location.rating = rating
+                location.total_reviews = review_count
+                location.updated_at = datetime.utcnow()
+            count += 1
+
+        db.session.commit()
+        return count
+
+class LocationPopularity(db.Model):
+    """Time-decayed popularity per location, kept up to date by booking and review writes.
+
+    Uses forward decay: an event at time t adds weight * 2^((t - EPOCH) / HALF_LIFE)
+    to the stored score, so old scores never need rewriting and ordering by
+    the indexed score column is ordering by decayed popularity. The decayed
+    value at a moment is the score divided by the same factor taken then.
+    """
+    __tablename__ = 'location_popularity'
+    __table_args__ = (
+        db.Index('idx_location_popularity_score', 'score'),
+    )
+
+    EPOCH = datetime(2024, 1, 1)
+    HALF_LIFE_DAYS = 14.0
+
+    # Event weights; a review counts rating / 5 of REVIEW
+    BOOKING_CREATED = 1.0
+    BOOKING_PAID = 2.0
+    REVIEW = 1.5
+
+    location_id = db.Column(db.Integer, db.ForeignKey('tambal_locations.id', ondelete='CASCADE'), primary_key=True)
+
+    # Double precision: scores pass 2^128, the range of a 4-byte FLOAT, ~128 half-lives after EPOCH
+    score = db.Column(db.Float(precision=53), nullable=False, default=0)
+
+    @classmethod
+    def growth(cls, moment=None):
+        """Get the forward decay factor 2^((moment - EPOCH) / HALF_LIFE)"""
+        moment = moment or datetime.utcnow()
+        days = (moment - cls.EPOCH).total_seconds() / 86400.0
+        return math.pow(2.0, days / cls.HALF_LIFE_DAYS)
+
+    @classmethod
+    def decayed(cls, score, moment=None):
+        """Get the popularity at a moment of a stored score"""
+        return (score or 0.0) / cls.growth(moment)
+
+    @classmethod
+    def record(cls, location_id, weight, moment=None):
+        """Add an event to a location's score (caller commits)"""
+        increment = weight * cls.growth(moment)
+
+        # Concurrent first events race on this insert, the loser's is ignored and both updates apply
+        db.session.execute(
+            cls.__table__.insert()
+               .prefix_with('OR IGNORE', dialect='sqlite')
+               .prefix_with('IGNORE', dialect='mysql'),
+            {'location_id': location_id, 'score': 0.0}
+        )
+        cls.query.filter_by(location_id=location_id)\
+                 .update({cls.score: cls.score + increment}, synchronize_session=False)
+
+    @classmethod
+    def record_review(cls, location_id, rating, moment=None):
+        cls.record(location_id, cls.REVIEW * rating / 5.0, moment)
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute all scores from the bookings and reviews tables, returns location count"""
+        scores = {}
+
+        for location_id, created_at, payment_status in db.session.query(
+                Booking.location_id, Booking.created_at, Booking.payment_status).all():
+            moment = created_at or datetime.utcnow()
+            weight = cls.BOOKING_CREATED + (cls.BOOKING_PAID if payment_status == 'paid' else 0)
+            scores[location_id] = scores.get(location_id, 0.0) + weight * cls.growth(moment)
+
+        for location_id, created_at, rating in db.session.query(
+                Review.location_id, Review.created_at, Review.rating).all():
+            moment = created_at or datetime.utcnow()
+            scores[location_id] = scores.get(location_id, 0.0) + cls.REVIEW * rating / 5.0 * cls.growth(moment)
+
+        cls.query.delete(synchronize_session=False)
+        if scores:
+            db.session.execute(cls.__table__.insert(), [
+                {'location_id': location_id, 'score': score} for location_id, score in scores.items()
+            ])
+        db.session.commit()
+        return len(scores)
+
+class LocationAlternatives(db.Model):
+    """Precomputed nearest active neighbours of a location, shown when it is closed or full.
+
+    neighbours holds a JSON list of {location_id, name, distance} nearest
+    first, so the shop page gets its alternatives with one primary key
+    lookup instead of a radius search.
+    """
+    __tablename__ = 'location_alternatives'
+
+    # Neighbours kept per location and how far away they may be (km)
+    K = 5
+    MAX_DISTANCE_KM = 20.0
+
+    location_id = db.Column(db.Integer, db.ForeignKey('tambal_locations.id', ondelete='CASCADE'), primary_key=True)
+    neighbours = db.Column(db.Text, nullable=False, default='[]')
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def get_neighbours(self):
+        try:
+            neighbours = json.loads(self.neighbours or '[]')
+        except ValueError:
+            return []
+        return neighbours if isinstance(neighbours, list) else []
+
+    @classmethod
+    def replace(cls, alternatives):
+        """Replace the rows of {location_id: neighbours} (caller commits)"""
+        if not alternatives:
+            return
+
+        cls.query.filter(cls.location_id.in_(list(alternatives)))\
+                 .delete(synchronize_session=False)
+
+        now = datetime.utcnow()
+        db.session.execute(cls.__table__.insert(), [
+            {'location_id': location_id, 'neighbours': json.dumps(neighbours, separators=(',', ':')), 'computed_at': now}
+            for location_id, neighbours in alternatives.items()
+        ])
@@ -0,0 +1,99 @@
+import threading
+import time
+
+class LocationStats:
+    """In-process platform counters behind /api/locations/stats.
+
+    Loaded from the database once, then patched by location and review
+    writes so a stats request reads a few numbers instead of scanning the
+    tables. Writes made by other worker processes are picked up when the
+    counters are reloaded after the staleness window.
+    """
+
+    def __init__(self, timer=time.monotonic):
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._ratings = {}
+        self._rating_sum = 0.0
+        self._review_count = 0
+        self._top_id = None
+        self._top_location = None
+
+    def is_fresh(self, max_age):
+        """Check whether the counters were loaded less than max_age seconds ago"""
+        with self._lock:
+            return self._loaded_at is not None and self._timer() - self._loaded_at < max_age
+
+    def load(self, ratings, review_count):
+        """Replace the counters with (location_id, rating) rows of active locations"""
+        with self._lock:
+            self._ratings = {location_id: float(rating or 0) for location_id, rating in ratings}
+            self._rating_sum = sum(self._ratings.values())
+            self._review_count = review_count
+            self._top_id = None
+            self._top_location = None
+            self._loaded_at = self._timer()
+
+    def clear(self):
+        with self._lock:
+            self._loaded_at = None
+            self._ratings = {}
+            self._rating_sum = 0.0
+            self._review_count = 0
+            self._top_id = None
+            self._top_location = None
+
+    def update_location(self, location_id, rating, is_active):
+        """Apply a location write"""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+
+            previous = self._ratings.pop(location_id, None)
+            if previous is not None:
+                self._rating_sum -= previous
+
+            if is_active:
+                rating = float(rating or 0)
+                self._ratings[location_id] = rating
+                self._rating_sum += rating
+
+            if location_id == self._top_id:
+                # The top location changed, its rank and payload are re-derived on read
+                self._top_id = None
+                self._top_location = None
+            elif is_active and self._top_id is not None and \
+                    (rating, -location_id) > (self._ratings[self._top_id], -self._top_id):
+                self._top_id = location_id
+                self._top_location = None
+
+    def add_reviews(self, count=1):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._review_count += count
+
+    def snapshot(self, load_location):
+        """Get the counters, load_location(location_id) serializes the top rated location
+
+        load_location returns None for a location deleted since the counters
+        were loaded, it is dropped and the next-ranked location is used.
+        """
+        with self._lock:
+            while self._top_location is None and self._ratings:
+                if self._top_id is None:
+                    self._top_id = max(self._ratings, key=lambda location_id: (self._ratings[location_id], -location_id))
+                self._top_location = load_location(self._top_id)
+                if self._top_location is None:
+                    self._rating_sum -= self._ratings.pop(self._top_id)
+                    self._top_id = None
+
+            total_locations = len(self._ratings)
+            return {
+                'total_locations': total_locations,
+                'total_reviews': self._review_count,
+                'average_rating': self._rating_sum / total_locations if total_locations else 0,
+                'top_location': self._top_location
+            }
+
+location_stats = LocationStats()
@@ -1,37 +1,406 @@
-from flask import Blueprint, jsonify, request
-from src.models.user import TambalLocation, Review, UserSession, db
-from sqlalchemy import func, and_, or_
-import math
+from flask import Blueprint, jsonify, request, current_app, g
+from src.models.user import TambalLocation, Review, db
+from sqlalchemy import and_, or_
+from src.models.location_models import LocationService, LocationRatingStats, LocationPopularity, LocationAlternatives, normalize_service
+from src.routes.pagination import cursor_page_response, keyset_index, encode_cursor, decode_cursor
+from src.routes.cache import TTLCache
+from src.routes.operating_hours import operating_hours_index, local_time_slot
+from src.routes import location_fulltext
+from src.routes.location_import import validate_location_data, validate_coordinate, build_location, import_locations, detect_format, COORDINATE_RANGES
+from src.routes.autocomplete import suggestion_index
+from src.routes.location_stats import location_stats
+from src.routes.location_clusters import cluster_cache, get_viewport_clusters, viewport_tile_count, DETAIL_ZOOM, MAX_ZOOM, MAX_VIEWPORT_TILES
+from datetime import datetime, timedelta
+from src.routes.geo_index import calculate_distance, bounding_box, location_index, PointSet, KM_PER_DEGREE
+from src.routes.session_auth import login_required
+import click
+import hashlib
+import heapq
+import io
 import json
+import math
 
 locations_bp = Blueprint('locations', __name__)
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points using Haversine formula"""
-    # Convert latitude and longitude from degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+# Serialized get_location responses: location_id -> (body, etag, last_modified)
+location_detail_cache = TTLCache(maxsize=2048, ttl=300)
+
+# Radius search candidates: (cell, radius, service) -> PointSet
+search_cache = TTLCache(maxsize=1024, ttl=120)
+
+# Size in degrees of the cells search coordinates are quantized to (~1.1 km)
+SEARCH_CACHE_CELL = 0.01
+
+# Maximum number of coordinates in one /nearby/batch request
+MAX_BATCH_QUERIES = 100
+
+# Largest radius (km) and result count of one /nearby/batch coordinate
+MAX_BATCH_RADIUS = 25
+MAX_BATCH_LIMIT = 50
+
+# Maximum number of locations /clusters returns at detail zoom
+MAX_DETAIL_LOCATIONS = 500
+
+# Maximum number of locations in one /changes page
+MAX_CHANGES_PAGE = 1000
+
+# /changes only returns rows at least this old, so a transaction that took
+# its updated_at earlier but commits later is not skipped by a watermark
+CHANGES_SAFETY_LAG = timedelta(seconds=5)
+
+# Maximum number of row errors returned by /import
+MAX_IMPORT_ERRORS = 100
+
+# Composite index used by the bounding box pushdown (see schema.sql)
+if not any(index.name == 'idx_tambal_locations_coordinates' for index in TambalLocation.__table__.indexes):
+    db.Index('idx_tambal_locations_coordinates', TambalLocation.latitude, TambalLocation.longitude)
+
+# Delta sync scans (updated_at, id), see schema.sql
+if not any(index.name == 'idx_tambal_locations_updated_at' for index in TambalLocation.__table__.indexes):
+    db.Index('idx_tambal_locations_updated_at', TambalLocation.updated_at, TambalLocation.id)
+
+keyset_index('idx_reviews_location_created', Review, Review.location_id)
+
+def get_index_max_age():
+    """Seconds an in-process index is trusted before it is reloaded to pick up other workers' writes"""
+    return current_app.config.get('LOCATION_INDEX_MAX_AGE', 300)
+
+def get_location_index():
+    """Get the spatial index, reloading it from the database once older than LOCATION_INDEX_MAX_AGE"""
+    if not location_index.is_fresh(get_index_max_age()):
+        points = db.session.query(TambalLocation.id, TambalLocation.latitude, TambalLocation.longitude)\
+                           .filter(TambalLocation.is_active == True)\
+                           .all()
+        location_index.load(points)
+    
+    return location_index
+
+def get_operating_hours_index():
+    """Get the parsed operating hours index, reloading it once older than LOCATION_INDEX_MAX_AGE"""
+    if not operating_hours_index.is_fresh(get_index_max_age()):
+        rows = db.session.query(TambalLocation.id, TambalLocation.operating_hours)\
+                         .filter(TambalLocation.is_active == True)\
+                         .all()
+        operating_hours_index.load(rows)
+    
+    return operating_hours_index
+
+def get_open_slot():
+    """Get the (weekday, minute) requested by open_at/open_now, None when not filtering
     
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
+    Raises ValueError for a malformed open_at.
+    """
+    open_at = request.args.get('open_at')
+    if open_at:
+        return local_time_slot(datetime.fromisoformat(open_at.replace('Z', '+00:00')))
     
-    # Radius of earth in kilometers
-    r = 6371
+    if request.args.get('open_now', 'false').lower() in ('1', 'true', 'yes'):
+        return local_time_slot()
     
-    return c * r
+    return None
 
-def get_current_user(token):
-    """Get current user from token"""
-    if not token:
-        return None
+def sync_location_index(location):
+    """Patch the spatial and operating hours indexes after a location has been written"""
+    if location_index.loaded:
+        if location.is_active:
+            location_index.upsert(location.id, location.latitude, location.longitude)
+        else:
+            location_index.remove(location.id)
     
-    session = UserSession.query.filter_by(session_token=token).first()
-    if not session or session.is_expired():
-        return None
+    if operating_hours_index.loaded:
+        if location.is_active:
+            operating_hours_index.upsert(location.id, location.operating_hours)
+        else:
+            operating_hours_index.remove(location.id)
+
+def on_location_written(location, previous_position=None):
+    """Refresh in-process indexes, caches and alternatives after a location has been written
+    
+    previous_position is the (latitude, longitude) the location had before an update.
+    """
+    sync_location_index(location)
+    sync_alternatives(location, previous_position)
+    location_detail_cache.pop(location.id)
+    search_cache.clear()
+    cluster_cache.clear()
+    sync_suggestions(location)
+    location_stats.update_location(location.id, location.rating, location.is_active)
+
+def on_reviews_written(location, added=0):
+    """Drop cached data derived from a location's reviews, added is the number of new reviews"""
+    location_detail_cache.pop(location.id)
+    cluster_cache.clear()
+    location_stats.update_location(location.id, location.rating, location.is_active)
+    location_stats.add_reviews(added)
+    sync_suggestions(location)
+
+def on_locations_imported():
+    """Rebuild everything derived from tambal_locations once after a bulk import"""
+    LocationService.rebuild()
+    location_fulltext.rebuild()
+    location_index.clear()
+    operating_hours_index.clear()
+    suggestion_index.clear()
+    search_cache.clear()
+    cluster_cache.clear()
+    location_stats.clear()
+    rebuild_alternatives()
+
+def compute_alternatives(location_ids):
+    """Get {location_id: neighbours} of the given active locations from the spatial index"""
+    index = get_location_index()
+    sources = db.session.query(TambalLocation.id, TambalLocation.latitude, TambalLocation.longitude)\
+                        .filter(TambalLocation.id.in_(list(location_ids)), TambalLocation.is_active == True)\
+                        .all()
+    
+    found = index.nearest_each([(latitude, longitude) for _, latitude, longitude in sources],
+                               LocationAlternatives.K + 1, LocationAlternatives.MAX_DISTANCE_KM)
+    nearest = {
+        location_id: [hit for hit in hits if hit[0] != location_id][:LocationAlternatives.K]
+        for (location_id, _, _), hits in zip(sources, found)
+    }
+    
+    neighbour_ids = {neighbour_id for hits in nearest.values() for neighbour_id, _ in hits}
+    names = dict(db.session.query(TambalLocation.id, TambalLocation.name)
+                           .filter(TambalLocation.id.in_(list(neighbour_ids)))
+                           .all()) if neighbour_ids else {}
+    
+    return {
+        location_id: [
+            {'location_id': neighbour_id, 'name': names[neighbour_id], 'distance': round(distance, 2)}
+            for neighbour_id, distance in hits if neighbour_id in names
+        ]
+        for location_id, hits in nearest.items()
+    }
+
+def sync_alternatives(location, previous_position=None):
+    """Recompute the alternatives a location write can change, in their own transaction
     
-    return session.user
+    Those are the location's own list, lists that contain it (it moved,
+    closed or was renamed) and lists it now belongs in. Only locations
+    within MAX_DISTANCE_KM of its old or new position can be affected.
+    """
+    try:
+        index = get_location_index()
+        radius = LocationAlternatives.MAX_DISTANCE_KM
+        
+        nearby = dict(index.within_radius(location.latitude, location.longitude, radius))
+        nearby_before = set(nearby)
+        if previous_position is not None:
+            nearby_before.update(location_id for location_id, _ in index.within_radius(*previous_position, radius))
+        nearby_before.discard(location.id)
+        
+        recompute = {location.id}
+        if nearby_before:
+            for row in LocationAlternatives.query.filter(LocationAlternatives.location_id.in_(list(nearby_before))).all():
+                neighbours = row.get_neighbours()
+                if any(neighbour['location_id'] == location.id for neighbour in neighbours):
+                    recompute.add(row.location_id)
+                elif location.is_active and row.location_id in nearby and (
+                        len(neighbours) < LocationAlternatives.K or nearby[row.location_id] < neighbours[-1]['distance']):
+                    recompute.add(row.location_id)
+        
+        alternatives = compute_alternatives(recompute)
+        
+        # Inactive locations keep no alternatives
+        stale = recompute - set(alternatives)
+        if stale:
+            LocationAlternatives.query.filter(LocationAlternatives.location_id.in_(list(stale)))\
+                                      .delete(synchronize_session=False)
+        LocationAlternatives.replace(alternatives)
+        db.session.commit()
+        
+        for location_id in recompute:
+            location_detail_cache.pop(location_id)
+    except Exception:
+        # The location itself is saved, rebuild-alternatives repairs the lists
+        db.session.rollback()
+        current_app.logger.exception('Gagal memperbarui alternatif lokasi %s', location.id)
+
+def load_alternatives(location):
+    """Get the precomputed alternatives of a location, read only
+    
+    Locations created before location_alternatives existed have no row
+    until their next write or `flask rebuild-alternatives --missing-only`.
+    """
+    row = LocationAlternatives.query.get(location.id)
+    return row.get_neighbours() if row is not None else []
+
+def rebuild_alternatives(batch_size=500, missing_only=False):
+    """Recompute the alternatives of every active location, returns location count
+    
+    With missing_only, only locations without a row are computed and the
+    existing rows are kept.
+    """
+    query = db.session.query(TambalLocation.id).filter(TambalLocation.is_active == True)
+    if missing_only:
+        query = query.filter(~TambalLocation.id.in_(db.session.query(LocationAlternatives.location_id)))
+    location_ids = [row[0] for row in query.all()]
+    
+    if not missing_only:
+        LocationAlternatives.query.delete(synchronize_session=False)
+    for start in range(0, len(location_ids), batch_size):
+        LocationAlternatives.replace(compute_alternatives(location_ids[start:start + batch_size]))
+    db.session.commit()
+    
+    location_detail_cache.clear()
+    return len(location_ids)
+
+def get_location_stats_snapshot():
+    """Get the platform counters, reloading them once older than LOCATION_STATS_MAX_AGE seconds"""
+    if not location_stats.is_fresh(current_app.config.get('LOCATION_STATS_MAX_AGE', 300)):
+        ratings = db.session.query(TambalLocation.id, TambalLocation.rating)\
+                            .filter(TambalLocation.is_active == True)\
+                            .all()
+        location_stats.load(ratings, Review.query.count())
+    
+    def load_location(location_id):
+        location = TambalLocation.query.get(location_id)
+        return location.to_dict() if location is not None else None
+    
+    return location_stats.snapshot(load_location)
+
+def start_suggestion_build(app):
+    """Rebuild the autocomplete trie on a background thread, requests keep the current one meanwhile"""
+    def load_rows():
+        with app.app_context():
+            try:
+                return db.session.query(
+                    TambalLocation.id, TambalLocation.name, TambalLocation.address,
+                    TambalLocation.rating, TambalLocation.total_reviews
+                ).filter(TambalLocation.is_active == True).all()
+            except Exception:
+                app.logger.exception('Gagal memuat saran lokasi')
+                raise
+            finally:
+                db.session.remove()
+    
+    return suggestion_index.start_build(load_rows)
+
+def sync_suggestions(location):
+    """Patch the autocomplete trie with a location's name, address and rating"""
+    if location.is_active:
+        suggestion_index.upsert(location.id, location.name, location.address, location.rating, location.total_reviews)
+    else:
+        suggestion_index.remove(location.id)
+
+def bounding_box_clause(latitude, longitude, radius):
+    """Get the SQL condition for the lat/lng bounding box of a radius in km"""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius)
+    clause = TambalLocation.latitude.between(min_lat, max_lat)
+    
+    # Boxes crossing the antimeridian only get the latitude filter
+    if min_lng >= -180.0 and max_lng <= 180.0:
+        clause = and_(clause, TambalLocation.longitude.between(min_lng, max_lng))
+    
+    return clause
+
+def filter_bounding_box(query, latitude, longitude, radius):
+    """Restrict a location query to the lat/lng bounding box of a radius in km"""
+    return query.filter(bounding_box_clause(latitude, longitude, radius))
+
+def find_locations_within(latitude, longitude, radius, limit=None):
+    """Get [(location_id, distance_km)] of active locations within radius, nearest first
+    
+    LOCATION_SEARCH_BACKEND selects the in-process spatial index ('index',
+    default) or a bounding box query against the database ('sql'), which
+    stays consistent across worker processes.
+    """
+    if current_app.config.get('LOCATION_SEARCH_BACKEND', 'index') == 'index':
+        index = get_location_index()
+        if limit is None:
+            return index.within_radius(latitude, longitude, radius)
+        return index.nearest(latitude, longitude, limit, radius=radius)
+    
+    query = db.session.query(TambalLocation.id, TambalLocation.latitude, TambalLocation.longitude)\
+                      .filter(TambalLocation.is_active == True)
+    rows = filter_bounding_box(query, latitude, longitude, radius).all()
+    
+    # Exact Haversine post-filter, the box also contains its corners
+    hits = []
+    for location_id, location_lat, location_lng in rows:
+        distance = calculate_distance(latitude, longitude, float(location_lat), float(location_lng))
+        if distance <= radius:
+            hits.append((location_id, distance))
+    
+    hits.sort(key=lambda hit: hit[1])
+    return hits if limit is None else hits[:limit]
+
+_services_indexed = False
+
+def ensure_services_indexed():
+    """Backfill location_services once per process for locations written before the table existed
+    
+    Locations are checked one by one, a table already holding the rows of
+    newer locations does not hide the older ones.
+    """
+    global _services_indexed
+    if _services_indexed:
+        return
+    
+    LocationService.backfill()
+    _services_indexed = True
+
+def search_locations_within(latitude, longitude, radius, service_type=''):
+    """Get [(location_id, distance_km)] within radius offering service_type, nearest first
+    
+    Candidates are cached per quantized coordinate cell, radius and service
+    filter: the cached set covers the radius around every point of the cell,
+    so the exact distances for the query point are re-derived from it without
+    touching the index or the database.
+    """
+    if not (math.isfinite(latitude) and math.isfinite(longitude)):
+        return []
+    
+    service_key = normalize_service(service_type) if service_type else ''
+    cell = (math.floor(latitude / SEARCH_CACHE_CELL), math.floor(longitude / SEARCH_CACHE_CELL))
+    key = (cell, radius, service_key)
+    
+    candidates = search_cache.get(key)
+    if candidates is None:
+        center_lat = (cell[0] + 0.5) * SEARCH_CACHE_CELL
+        center_lng = (cell[1] + 0.5) * SEARCH_CACHE_CELL
+        
+        # Farthest a point of the cell can be from its center
+        padding = SEARCH_CACHE_CELL / 2 * math.sqrt(2) * KM_PER_DEGREE
+        candidate_ids = [location_id for location_id, _ in find_locations_within(center_lat, center_lng, radius + padding)]
+        
+        query = db.session.query(TambalLocation.id, TambalLocation.latitude, TambalLocation.longitude)\
+                          .filter(TambalLocation.id.in_(candidate_ids))
+        if service_key:
+            ensure_services_indexed()
+            query = query.filter(TambalLocation.id.in_(LocationService.location_ids(service_key)))
+        
+        candidates = PointSet(query.all())
+        search_cache.set(key, candidates, ttl=current_app.config.get('SEARCH_CACHE_TTL', 120))
+    
+    return candidates.within_radius(latitude, longitude, radius)
+
+def load_candidate_points(queries):
+    """Get [(location_id, latitude, longitude)] that may lie within any (lat, lng, radius, k) query"""
+    if current_app.config.get('LOCATION_SEARCH_BACKEND', 'index') == 'index':
+        index = get_location_index()
+        points = {}
+        for latitude, longitude, radius, _ in queries:
+            for point in index.candidate_points(latitude, longitude, radius):
+                points[point[0]] = point
+        return list(points.values())
+    
+    boxes = [bounding_box_clause(latitude, longitude, radius) for latitude, longitude, radius, _ in queries]
+    return db.session.query(TambalLocation.id, TambalLocation.latitude, TambalLocation.longitude)\
+                     .filter(TambalLocation.is_active == True, or_(*boxes))\
+                     .all()
+
+@locations_bp.before_app_request
+def prepare_fulltext_index():
+    """Make sure the full-text index exists before a request writes or searches it"""
+    location_fulltext.get_backend()
+
+@locations_bp.before_app_request
+def prepare_suggestions():
+    """Start building the autocomplete trie with the first request, and again once stale"""
+    if not suggestion_index.is_fresh(get_index_max_age()):
+        start_suggestion_build(current_app._get_current_object())
 
 @locations_bp.route('/search', methods=['GET'])
 def search_locations():
@@ -42,50 +411,104 @@ def search_locations():
         longitude = request.args.get('lng', type=float)
         radius = request.args.get('radius', default=10, type=int)  # km
         service_type = request.args.get('service_type', '')
-        sort_by = request.args.get('sort_by', 'distance')  # distance, rating, price
+        text_query = request.args.get('q', '').strip()
+        sort_by = request.args.get('sort_by', 'relevance' if text_query else 'distance')  # relevance, distance, rating, name
         limit = request.args.get('limit', default=20, type=int)
         offset = request.args.get('offset', default=0, type=int)
         
+        try:
+            open_slot = get_open_slot()
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'Format open_at tidak valid'
+            }), 400
+        
+        # Locations open at the requested time, from the pre-parsed hours index
+        open_ids = get_operating_hours_index().open_ids(*open_slot) if open_slot else None
+        
+        # Full-text matches over name, address and description
+        text_scores = None
+        
         # Base query
         query = TambalLocation.query.filter(TambalLocation.is_active == True)
         
-        # Filter by service type if provided
-        if service_type:
-            query = query.filter(TambalLocation.services.contains(service_type))
-        
-        # Get all locations
-        locations = query.all()
+        # Narrow down to locations inside the radius, service filter included
+        distances = None
+        if latitude and longitude:
+            hits = search_locations_within(latitude, longitude, radius, service_type)
+            if open_ids is not None:
+                hits = [hit for hit in hits if hit[0] in open_ids]
+            if text_query:
+                # Only the locations inside the radius are ranked, matches elsewhere cannot crowd them out
+                text_scores = dict(location_fulltext.search(text_query, location_ids=[location_id for location_id, _ in hits]))
+                hits = [hit for hit in hits if hit[0] in text_scores]
+            distances = dict(hits)
+            query = query.filter(TambalLocation.id.in_(list(distances)))
+        else:
+            if service_type:
+                # Filter by service type through the normalized service index
+                ensure_services_indexed()
+                query = query.filter(TambalLocation.id.in_(LocationService.location_ids(service_type)))
+            
+            if open_ids is not None:
+                query = query.filter(TambalLocation.id.in_(list(open_ids)))
+            
+            if text_query:
+                # The database filters, sorts and counts every match
+                query = query.filter(location_fulltext.match_clause(text_query))
+                if sort_by == 'relevance':
+                    text_scores = dict(location_fulltext.search(text_query))
+        
+        ordered_ids = None
+        if sort_by == 'relevance' and text_scores is not None:
+            # Text relevance, blended with proximity when searching around a point
+            best_score = max(text_scores.values(), default=0) or 1
+            if distances is not None:
+                ordered_ids = sorted(
+                    distances,
+                    key=lambda location_id: -(0.7 * text_scores[location_id] / best_score
+                                              + 0.3 * (1 - distances[location_id] / radius if radius else 1))
+                )
+            else:
+                matching_ids = [row.id for row in query.with_entities(TambalLocation.id).all()]
+                ordered_ids = sorted(matching_ids, key=lambda location_id: -text_scores.get(location_id, 0))
+        elif sort_by == 'distance' and distances is not None:
+            # Distance order is only known here
+            ordered_ids = [location_id for location_id, _ in hits]
+        
+        if ordered_ids is not None:
+            # Page over the ordered ids
+            total = len(ordered_ids)
+            page_ids = ordered_ids[offset:offset + limit]
+            locations_by_id = {
+                location.id: location
+                for location in TambalLocation.query.filter(TambalLocation.id.in_(page_ids)).all()
+            }
+            locations = [locations_by_id[location_id] for location_id in page_ids if location_id in locations_by_id]
+        else:
+            # Let the database sort, count and paginate
+            if sort_by == 'rating':
+                query = query.order_by(TambalLocation.rating.desc(), TambalLocation.id.asc())
+            elif sort_by == 'name':
+                query = query.order_by(TambalLocation.name.asc(), TambalLocation.id.asc())
+            else:
+                query = query.order_by(TambalLocation.id.asc())
+            
+            total = query.order_by(None).count()
+            locations = query.offset(offset).limit(limit).all()
         
-        # Calculate distances and filter by radius if coordinates provided
+        # Only the returned page is serialized
         results = []
         for location in locations:
             location_dict = location.to_dict()
             
-            if latitude and longitude:
-                distance = calculate_distance(
-                    latitude, longitude,
-                    float(location.latitude), float(location.longitude)
-                )
-                location_dict['distance'] = round(distance, 2)
-                
-                # Filter by radius
-                if distance <= radius:
-                    results.append(location_dict)
+            if distances is not None:
+                location_dict['distance'] = round(distances[location.id], 2)
             else:
                 location_dict['distance'] = None
-                results.append(location_dict)
-        
-        # Sort results
-        if sort_by == 'distance' and latitude and longitude:
-            results.sort(key=lambda x: x['distance'] if x['distance'] is not None else float('inf'))
-        elif sort_by == 'rating':
-            results.sort(key=lambda x: x['rating'], reverse=True)
-        elif sort_by == 'name':
-            results.sort(key=lambda x: x['name'])
-        
-        # Apply pagination
-        total = len(results)
-        results = results[offset:offset + limit]
+            
+            results.append(location_dict)
         
         return jsonify({
             'success': True,
@@ -105,33 +528,63 @@ def search_locations():
 def get_location(location_id):
     """Get specific location details"""
     try:
-        location = TambalLocation.query.get(location_id)
-        
-        if not location:
-            return jsonify({
-                'success': False,
-                'message': 'Lokasi tidak ditemukan'
-            }), 404
+        # Read-through cache, a matching If-None-Match is answered without the database
+        cached = location_detail_cache.get(location_id)
         
-        if not location.is_active:
-            return jsonify({
-                'success': False,
-                'message': 'Lokasi tidak aktif'
-            }), 404
+        if cached is None:
+            location = TambalLocation.query.get(location_id)
+            
+            if not location:
+                return jsonify({
+                    'success': False,
+                    'message': 'Lokasi tidak ditemukan'
+                }), 404
+            
+            if not location.is_active:
+                return jsonify({
+                    'success': False,
+                    'message': 'Lokasi tidak aktif'
+                }), 404
+            
+            # Get recent reviews
+            reviews = Review.query.filter_by(location_id=location_id)\
+                                 .order_by(Review.created_at.desc())\
+                                 .limit(10)\
+                                 .all()
+            
+            # Precomputed star histogram, one primary key lookup
+            rating_stats = LocationRatingStats.query.get(location_id)
+            
+            location_dict = location.to_dict()
+            location_dict['reviews'] = [review.to_dict() for review in reviews]
+            location_dict['rating_distribution'] = rating_stats.distribution() if rating_stats \
+                else LocationRatingStats.empty_distribution()
+            
+            # Precomputed nearest active alternatives, one primary key lookup
+            location_dict['alternatives'] = load_alternatives(location)
+            
+            body = jsonify({
+                'success': True,
+                'location': location_dict
+            }).get_data()
+            
+            last_modified = max(
+                [timestamp for timestamp in [location.updated_at] + [review.created_at for review in reviews[:1]] if timestamp],
+                default=None
+            )
+            cached = (body, hashlib.sha256(body).hexdigest()[:32], last_modified)
+            location_detail_cache.set(location_id, cached)
         
-        # Get recent reviews
-        reviews = Review.query.filter_by(location_id=location_id)\
-                             .order_by(Review.created_at.desc())\
-                             .limit(10)\
-                             .all()
+        body, etag, last_modified = cached
         
-        location_dict = location.to_dict()
-        location_dict['reviews'] = [review.to_dict() for review in reviews]
+        response = current_app.response_class(body, status=200, mimetype='application/json')
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = 'no-cache'
         
-        return jsonify({
-            'success': True,
-            'location': location_dict
-        }), 200
+        # Turns into 304 Not Modified for matching If-None-Match / If-Modified-Since
+        return response.make_conditional(request)
         
     except Exception as e:
         return jsonify({
@@ -155,6 +608,10 @@ def get_location_reviews(location_id):
         limit = request.args.get('limit', default=10, type=int)
         offset = request.args.get('offset', default=0, type=int)
         
+        # Keyset pagination when a cursor parameter is sent (empty for the first page)
+        if 'cursor' in request.args:
+            return cursor_page_response(Review.query.filter_by(location_id=location_id), Review, limit, 'reviews', ('reviews', location_id))
+        
         # Get reviews with pagination
         reviews_query = Review.query.filter_by(location_id=location_id)\
                                    .order_by(Review.created_at.desc())
@@ -177,27 +634,12 @@ def get_location_reviews(location_id):
         }), 500
 
 @locations_bp.route('/<int:location_id>/reviews', methods=['POST'])
-def add_review():
+@login_required
+def add_review(location_id):
     """Add review for a location"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
-        location_id = request.view_args['location_id']
         location = TambalLocation.query.get(location_id)
         
         if not location:
@@ -247,16 +689,14 @@ def add_review():
         
         db.session.add(review)
         
-        # Update location rating
-        all_reviews = Review.query.filter_by(location_id=location_id).all()
-        total_rating = sum([r.rating for r in all_reviews]) + rating
-        total_reviews = len(all_reviews) + 1
-        
-        location.rating = total_rating / total_reviews
-        location.total_reviews = total_reviews
+        # Update location rating from the running sum/count
+        LocationRatingStats.add_rating(location, rating)
+        LocationPopularity.record_review(location_id, rating)
         
         db.session.commit()
         
+        on_reviews_written(location, added=1)
+        
         return jsonify({
             'success': True,
             'message': 'Review berhasil ditambahkan',
@@ -285,27 +725,35 @@ def get_nearby_locations():
                 'message': 'Koordinat latitude dan longitude harus disediakan'
             }), 400
         
-        # Get all active locations
-        locations = TambalLocation.query.filter(TambalLocation.is_active == True).all()
+        try:
+            open_slot = get_open_slot()
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'Format open_at tidak valid'
+            }), 400
         
-        # Calculate distances and filter
-        nearby_locations = []
-        for location in locations:
-            distance = calculate_distance(
-                latitude, longitude,
-                float(location.latitude), float(location.longitude)
-            )
-            
-            if distance <= radius:
-                location_dict = location.to_dict()
-                location_dict['distance'] = round(distance, 2)
-                nearby_locations.append(location_dict)
+        # Get the nearest active locations inside the radius
+        hits = search_locations_within(latitude, longitude, radius)
+        
+        if open_slot:
+            open_ids = get_operating_hours_index().open_ids(*open_slot)
+            hits = [hit for hit in hits if hit[0] in open_ids]
         
-        # Sort by distance
-        nearby_locations.sort(key=lambda x: x['distance'])
+        hits = hits[:limit]
         
-        # Apply limit
-        nearby_locations = nearby_locations[:limit]
+        locations = TambalLocation.query.filter(TambalLocation.id.in_([location_id for location_id, _ in hits])).all()
+        locations_by_id = {location.id: location for location in locations}
+        
+        nearby_locations = []
+        for location_id, distance in hits:
+            location = locations_by_id.get(location_id)
+            if location is None:
+                continue
+            
+            location_dict = location.to_dict()
+            location_dict['distance'] = round(distance, 2)
+            nearby_locations.append(location_dict)
         
         return jsonify({
             'success': True,
@@ -319,22 +767,70 @@ def get_nearby_locations():
             'message': 'Terjadi kesalahan server'
         }), 500
 
-@locations_bp.route('/popular', methods=['GET'])
-def get_popular_locations():
-    """Get popular locations based on rating and reviews"""
+@locations_bp.route('/nearby/batch', methods=['POST'])
+def get_nearby_locations_batch():
+    """Get nearby locations for many coordinates at once (fleet operators)"""
     try:
-        limit = request.args.get('limit', default=10, type=int)
+        data = request.get_json() or {}
+        raw_queries = data.get('queries')
         
-        # Get locations ordered by rating and total reviews
-        locations = TambalLocation.query.filter(TambalLocation.is_active == True)\
-                                       .order_by(TambalLocation.rating.desc(), 
-                                               TambalLocation.total_reviews.desc())\
-                                       .limit(limit)\
-                                       .all()
+        if not isinstance(raw_queries, list) or not raw_queries:
+            return jsonify({
+                'success': False,
+                'message': 'queries harus berupa daftar koordinat'
+            }), 400
+        
+        if len(raw_queries) > MAX_BATCH_QUERIES:
+            return jsonify({
+                'success': False,
+                'message': f'Maksimal {MAX_BATCH_QUERIES} koordinat per permintaan'
+            }), 400
+        
+        queries = []
+        for raw_query in raw_queries:
+            try:
+                latitude = float(raw_query['lat'])
+                longitude = float(raw_query['lng'])
+                radius = float(raw_query.get('radius', 5))  # km
+                limit = min(int(raw_query.get('limit', 10)), MAX_BATCH_LIMIT)
+                if not all(math.isfinite(value) for value in (latitude, longitude, radius)):
+                    raise ValueError('non-finite coordinate')
+            except (TypeError, KeyError, ValueError, AttributeError):
+                return jsonify({
+                    'success': False,
+                    'message': 'Setiap koordinat harus memiliki lat dan lng yang valid'
+                }), 400
+            
+            # The endpoint is public, a huge radius would load the whole catalogue
+            queries.append((latitude, longitude, min(max(radius, 0.0), MAX_BATCH_RADIUS), limit))
+        
+        # Load candidates once and compute all query/location distances in one pass
+        candidates = PointSet(load_candidate_points(queries))
+        all_hits = candidates.nearest_many(queries)
+        
+        location_ids = {location_id for hits in all_hits for location_id, _ in hits}
+        location_dicts = {
+            location.id: location.to_dict()
+            for location in TambalLocation.query.filter(TambalLocation.id.in_(list(location_ids))).all()
+        }
+        
+        results = []
+        for (latitude, longitude, radius, limit), hits in zip(queries, all_hits):
+            nearby_locations = [
+                dict(location_dicts[location_id], distance=round(distance, 2))
+                for location_id, distance in hits
+                if location_id in location_dicts
+            ]
+            results.append({
+                'lat': latitude,
+                'lng': longitude,
+                'locations': nearby_locations,
+                'total': len(nearby_locations)
+            })
         
         return jsonify({
             'success': True,
-            'locations': [location.to_dict() for location in locations]
+            'results': results
         }), 200
         
     except Exception as e:
@@ -343,63 +839,241 @@ def get_popular_locations():
             'message': 'Terjadi kesalahan server'
         }), 500
 
-@locations_bp.route('/', methods=['POST'])
-def create_location():
-    """Create new tambal ban location (admin only)"""
+@locations_bp.route('/suggestions', methods=['GET'])
+def get_location_suggestions():
+    """Get autocomplete suggestions (shop names, streets, districts) for a prefix"""
+    try:
+        prefix = request.args.get('q', '').strip()
+        limit = min(request.args.get('limit', default=8, type=int), suggestion_index.top_n)
+        
+        if not prefix:
+            return jsonify({
+                'success': True,
+                'suggestions': []
+            }), 200
+        
+        # Empty until the background build started by prepare_suggestions has finished
+        return jsonify({
+            'success': True,
+            'suggestions': suggestion_index.suggest(prefix, limit)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Terjadi kesalahan server'
+        }), 500
+
+@locations_bp.route('/clusters', methods=['GET'])
+def get_location_clusters():
+    """Get map markers for a viewport: clusters per grid tile, locations at high zoom"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
+        south = request.args.get('south', type=float)
+        west = request.args.get('west', type=float)
+        north = request.args.get('north', type=float)
+        east = request.args.get('east', type=float)
+        zoom = request.args.get('zoom', type=int)
+        
+        if None in (south, west, north, east, zoom):
+            return jsonify({
+                'success': False,
+                'message': 'south, west, north, east dan zoom harus diisi'
+            }), 400
+        
+        if not all(math.isfinite(value) for value in (south, west, north, east)):
             return jsonify({
                 'success': False,
-                'message': 'Token tidak valid'
-            }), 401
+                'message': 'Batas area peta tidak valid'
+            }), 400
         
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
+        zoom = max(0, min(zoom, MAX_ZOOM))
         
-        if not user:
+        if zoom >= DETAIL_ZOOM:
+            locations = TambalLocation.query.filter(
+                TambalLocation.is_active == True,
+                TambalLocation.latitude.between(min(south, north), max(south, north)),
+                TambalLocation.longitude.between(west, east)
+            ).limit(MAX_DETAIL_LOCATIONS).all()
+            
+            return jsonify({
+                'success': True,
+                'zoom': zoom,
+                'clusters': [],
+                'locations': [location.to_dict() for location in locations]
+            }), 200
+        
+        # Counted from the tile range, a huge viewport is rejected before any tile is listed
+        if viewport_tile_count(south, west, north, east, zoom) > MAX_VIEWPORT_TILES:
             return jsonify({
                 'success': False,
-                'message': 'User tidak valid'
-            }), 401
+                'message': 'Area peta terlalu luas untuk zoom ini'
+            }), 400
         
-        # For now, allow any authenticated user to create location
-        # In production, you might want to add admin role check
+        return jsonify({
+            'success': True,
+            'zoom': zoom,
+            'clusters': get_viewport_clusters(south, west, north, east, zoom),
+            'locations': []
+        }), 200
         
-        data = request.get_json()
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Terjadi kesalahan server'
+        }), 500
+
+@locations_bp.route('/changes', methods=['GET'])
+def get_location_changes():
+    """Get locations created, updated or deactivated since a watermark, oldest first
+    
+    Without since the whole catalogue is returned page by page, so a client
+    builds its local replica with the same calls it uses to keep it fresh.
+    Deactivated locations are included with is_active false.
+    """
+    try:
+        limit = max(1, min(request.args.get('limit', default=500, type=int), MAX_CHANGES_PAGE))
+        since = request.args.get('since')
         
-        # Validate required fields
-        required_fields = ['name', 'address', 'latitude', 'longitude']
-        for field in required_fields:
-            if not data.get(field):
+        query = TambalLocation.query.filter(TambalLocation.updated_at <= datetime.utcnow() - CHANGES_SAFETY_LAG)
+        
+        if since:
+            try:
+                updated_at, location_id = decode_cursor(since)
+            except ValueError as e:
                 return jsonify({
                     'success': False,
-                    'message': f'{field} harus diisi'
+                    'message': 'Watermark tidak valid'
                 }), 400
+            
+            query = query.filter(or_(
+                TambalLocation.updated_at > updated_at,
+                and_(TambalLocation.updated_at == updated_at, TambalLocation.id > location_id)
+            ))
         
-        # Create new location
-        location = TambalLocation(
-            name=data['name'].strip(),
-            address=data['address'].strip(),
-            latitude=data['latitude'],
-            longitude=data['longitude'],
-            phone=data.get('phone', '').strip(),
-            email=data.get('email', '').strip(),
-            description=data.get('description', '').strip()
-        )
+        locations = query.order_by(TambalLocation.updated_at.asc(), TambalLocation.id.asc())\
+                         .limit(limit + 1)\
+                         .all()
         
-        # Set services if provided
-        if data.get('services'):
-            location.set_services(data['services'])
+        has_more = len(locations) > limit
+        locations = locations[:limit]
         
-        # Set operating hours if provided
-        if data.get('operating_hours'):
-            location.set_operating_hours(data['operating_hours'])
+        # An empty page keeps the client's watermark
+        watermark = encode_cursor(locations[-1].updated_at, locations[-1].id) if locations else since
+        
+        return jsonify({
+            'success': True,
+            'locations': [location.to_dict() for location in locations],
+            'watermark': watermark,
+            'has_more': has_more
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Terjadi kesalahan server'
+        }), 500
+
+@locations_bp.route('/popular', methods=['GET'])
+def get_popular_locations():
+    """Get popular locations by time-decayed booking and review activity
+    
+    With lat/lng only locations within radius (km, default 10) are ranked.
+    Locations without activity follow, ordered by rating and reviews.
+    """
+    try:
+        limit = max(1, min(request.args.get('limit', default=10, type=int), 100))
+        latitude = request.args.get('lat', type=float)
+        longitude = request.args.get('lng', type=float)
+        radius = request.args.get('radius', default=10, type=float)
+        
+        if latitude is not None and longitude is not None:
+            # Popular near me: rank the nearby candidates on a few columns, then load only the top rows
+            distances = dict(find_locations_within(latitude, longitude, radius))
+            ranked = db.session.query(TambalLocation.id, LocationPopularity.score,
+                                      TambalLocation.rating, TambalLocation.total_reviews)\
+                               .outerjoin(LocationPopularity, LocationPopularity.location_id == TambalLocation.id)\
+                               .filter(TambalLocation.id.in_(list(distances)), TambalLocation.is_active == True)\
+                               .all() if distances else []
+            top = heapq.nlargest(limit, ranked, key=lambda row: (row[1] or 0.0, row[2] or 0, row[3] or 0))
+            scores = {row[0]: row[1] for row in top}
+            locations_by_id = {
+                location.id: location
+                for location in TambalLocation.query.filter(TambalLocation.id.in_(list(scores))).all()
+            } if top else {}
+            locations = [locations_by_id[row[0]] for row in top if row[0] in locations_by_id]
+        else:
+            # Walks idx_location_popularity_score, a top-k read
+            ranked = db.session.query(TambalLocation, LocationPopularity.score)\
+                               .join(LocationPopularity, LocationPopularity.location_id == TambalLocation.id)\
+                               .filter(TambalLocation.is_active == True)\
+                               .order_by(LocationPopularity.score.desc())\
+                               .limit(limit)\
+                               .all()
+            scores = {location.id: score for location, score in ranked}
+            locations = [location for location, _ in ranked]
+            
+            if len(locations) < limit:
+                rest = TambalLocation.query.filter(TambalLocation.is_active == True)
+                if scores:
+                    rest = rest.filter(~TambalLocation.id.in_(list(scores)))
+                locations += rest.order_by(TambalLocation.rating.desc(),
+                                           TambalLocation.total_reviews.desc())\
+                                 .limit(limit - len(locations))\
+                                 .all()
+            distances = {}
+        
+        now = datetime.utcnow()
+        results = []
+        for location in locations:
+            location_dict = location.to_dict()
+            location_dict['popularity'] = round(LocationPopularity.decayed(scores.get(location.id), now), 4)
+            if location.id in distances:
+                location_dict['distance'] = round(distances[location.id], 2)
+            results.append(location_dict)
+        
+        return jsonify({
+            'success': True,
+            'locations': results
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Terjadi kesalahan server'
+        }), 500
+
+@locations_bp.route('/', methods=['POST'])
+@login_required
+def create_location():
+    """Create new tambal ban location (admin only)"""
+    try:
+        user = g.current_user
+        
+        # For now, allow any authenticated user to create location
+        # In production, you might want to add admin role check
+        
+        data = request.get_json()
+        
+        # Validate required fields
+        error = validate_location_data(data)
+        if error:
+            return jsonify({
+                'success': False,
+                'message': error
+            }), 400
+        
+        # Create new location
+        location = build_location(data)
         
         db.session.add(location)
+        db.session.flush()
+        
+        LocationService.sync(location.id, location.services)
+        location_fulltext.index_location(location)
         db.session.commit()
         
+        on_location_written(location)
+        
         return jsonify({
             'success': True,
             'message': 'Lokasi berhasil ditambahkan',
@@ -413,26 +1087,64 @@ def create_location():
             'message': 'Terjadi kesalahan server'
         }), 500
 
-@locations_bp.route('/<int:location_id>', methods=['PUT'])
-def update_location(location_id):
-    """Update tambal ban location (admin only)"""
+@locations_bp.route('/import', methods=['POST'])
+@login_required
+def import_locations_upload():
+    """Bulk import locations from an uploaded CSV or JSONL file (admin only)"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
+        user = g.current_user
+        
+        upload = request.files.get('file')
+        if not upload:
             return jsonify({
                 'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
+                'message': 'File harus diunggah'
+            }), 400
         
-        if not user:
+        file_format = request.form.get('format') or detect_format(upload.filename)
+        if file_format not in ('csv', 'jsonl'):
             return jsonify({
                 'success': False,
-                'message': 'User tidak valid'
-            }), 401
+                'message': 'Format harus csv atau jsonl'
+            }), 400
+        
+        errors = []
+        
+        def report(error):
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({'line': error.line, 'message': error.message})
+        
+        # Decode the upload as it is read instead of loading it whole
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        try:
+            imported, failed = import_locations(stream, file_format, on_error=report)
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            on_locations_imported()
+        
+        return jsonify({
+            'success': True,
+            'message': f'{imported} lokasi berhasil diimpor',
+            'imported': imported,
+            'failed': failed,
+            'errors': errors
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Terjadi kesalahan server'
+        }), 500
+
+@locations_bp.route('/<int:location_id>', methods=['PUT'])
+@login_required
+def update_location(location_id):
+    """Update tambal ban location (admin only)"""
+    try:
+        user = g.current_user
         
         location = TambalLocation.query.get(location_id)
         
@@ -442,8 +1154,19 @@ def update_location(location_id):
                 'message': 'Lokasi tidak ditemukan'
             }), 404
         
+        previous_position = (location.latitude, location.longitude)
+        
         data = request.get_json()
         
+        for field in COORDINATE_RANGES:
+            if field in data:
+                error = validate_coordinate(field, data[field])
+                if error:
+                    return jsonify({
+                        'success': False,
+                        'message': error
+                    }), 400
+        
         # Update fields if provided
         if 'name' in data:
             location.name = data['name'].strip()
@@ -452,10 +1175,10 @@ def update_location(location_id):
             location.address = data['address'].strip()
         
         if 'latitude' in data:
-            location.latitude = data['latitude']
+            location.latitude = float(data['latitude'])
         
         if 'longitude' in data:
-            location.longitude = data['longitude']
+            location.longitude = float(data['longitude'])
         
         if 'phone' in data:
             location.phone = data['phone'].strip()
@@ -468,6 +1191,7 @@ def update_location(location_id):
         
         if 'services' in data:
             location.set_services(data['services'])
+            LocationService.sync(location.id, location.services)
         
         if 'operating_hours' in data:
             location.set_operating_hours(data['operating_hours'])
@@ -475,8 +1199,12 @@ def update_location(location_id):
         if 'is_active' in data:
             location.is_active = data['is_active']
         
+        location.updated_at = datetime.utcnow()
+        location_fulltext.index_location(location)
         db.session.commit()
         
+        on_location_written(location, previous_position)
+        
         return jsonify({
             'success': True,
             'message': 'Lokasi berhasil diperbarui',
@@ -494,26 +1222,15 @@ def update_location(location_id):
 def get_location_stats():
     """Get location statistics"""
     try:
-        total_locations = TambalLocation.query.filter(TambalLocation.is_active == True).count()
-        total_reviews = Review.query.count()
-        
-        # Average rating
-        avg_rating = db.session.query(func.avg(TambalLocation.rating))\
-                              .filter(TambalLocation.is_active == True)\
-                              .scalar()
-        
-        # Top rated location
-        top_location = TambalLocation.query.filter(TambalLocation.is_active == True)\
-                                          .order_by(TambalLocation.rating.desc())\
-                                          .first()
+        stats = get_location_stats_snapshot()
         
         return jsonify({
             'success': True,
             'stats': {
-                'total_locations': total_locations,
-                'total_reviews': total_reviews,
-                'average_rating': round(float(avg_rating), 2) if avg_rating else 0,
-                'top_location': top_location.to_dict() if top_location else None
+                'total_locations': stats['total_locations'],
+                'total_reviews': stats['total_reviews'],
+                'average_rating': round(float(stats['average_rating']), 2) if stats['average_rating'] else 0,
+                'top_location': stats['top_location']
             }
         }), 200
         
@@ -523,3 +1240,54 @@ def get_location_stats():
             'message': 'Terjadi kesalahan server'
         }), 500
 
+@locations_bp.cli.command('rebuild-services')
+def rebuild_services_command():
+    """Rebuild the normalized location_services table"""
+    count = LocationService.rebuild()
+    click.echo(f'{count} baris layanan dibangun ulang')
+
+@locations_bp.cli.command('recompute-ratings')
+@click.option('--location-id', type=int, default=None, help='Only recompute this location')
+def recompute_ratings_command(location_id):
+    """Recompute location ratings from the reviews table"""
+    count = LocationRatingStats.recompute(location_id)
+    click.echo(f'Rating {count} lokasi dihitung ulang')
+
+@locations_bp.cli.command('rebuild-fulltext')
+def rebuild_fulltext_command():
+    """Rebuild the full-text index over location name, address and description"""
+    count = location_fulltext.rebuild()
+    click.echo(f'{count} lokasi diindeks ulang ({location_fulltext.get_backend()})')
+
+@locations_bp.cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']), default=None, help='Default: from the file extension')
+@click.option('--batch-size', type=int, default=500, help='Rows per insert transaction')
+def import_locations_command(path, file_format, batch_size):
+    """Bulk import locations from a CSV or JSONL file"""
+    def report(error):
+        click.echo(f'Baris {error.line}: {error.message}', err=True)
+
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as stream:
+            imported, failed = import_locations(stream, file_format or detect_format(path), batch_size, on_error=report)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        on_locations_imported()
+
+    click.echo(f'{imported} lokasi diimpor, {failed} baris gagal')
+
+@locations_bp.cli.command('rebuild-popularity')
+def rebuild_popularity_command():
+    """Recompute time-decayed popularity scores from bookings and reviews"""
+    count = LocationPopularity.rebuild()
+    click.echo(f'Popularitas {count} lokasi dihitung ulang')
+
+@locations_bp.cli.command('rebuild-alternatives')
+@click.option('--missing-only', is_flag=True, help='Only compute locations that have no alternatives yet')
+def rebuild_alternatives_command(missing_only):
+    """Recompute the nearest alternative shops of every active location"""
+    count = rebuild_alternatives(missing_only=missing_only)
+    click.echo(f'Alternatif {count} lokasi dihitung ulang')
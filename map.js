@@ -10,6 +10,9 @@ let directionsRenderer;
 let placesService;
 let geocoder;
 
+// True while the markers show search results, viewport clusters would replace them
+let searchMode = false;
+
 // Sample locations data (in production, this would come from API)
 const sampleLocations = [
     {
@@ -152,6 +155,14 @@ function initMap() {
     // Load sample locations
     loadLocations(sampleLocations);
     
+    // Reload markers from the clusters API whenever the viewport settles
+    map.addListener('idle', loadViewportMarkers);
+    
+    // Dragging the map leaves the search results and goes back to browsing
+    map.addListener('dragstart', () => {
+        searchMode = false;
+    });
+    
     // Initialize search functionality
     initializeSearch();
 }
@@ -273,6 +284,78 @@ function addLocationMarker(location) {
     markers.push(marker);
 }
 
+// Load clusters (or locations at high zoom) for the visible map area
+async function loadViewportMarkers() {
+    // Search moves the map too, its filtered markers must stay
+    if (searchMode) return;
+    
+    const bounds = map.getBounds();
+    if (!bounds) return;
+    
+    const params = new URLSearchParams({
+        south: bounds.getSouthWest().lat(),
+        west: bounds.getSouthWest().lng(),
+        north: bounds.getNorthEast().lat(),
+        east: bounds.getNorthEast().lng(),
+        zoom: map.getZoom()
+    });
+    
+    try {
+        const response = await fetch(`/api/locations/clusters?${params}`);
+        const data = await response.json();
+        
+        // Keep the current markers when the API is unavailable or a search started meanwhile
+        if (!response.ok || !data.success || searchMode) return;
+        
+        clearMarkers();
+        data.clusters.forEach(cluster => addClusterMarker(cluster));
+        data.locations.forEach(location => addLocationMarker(toMapLocation(location)));
+    } catch (error) {
+        console.warn('Cluster load error:', error);
+    }
+}
+
+// Convert an API location to the shape used by the map markers
+function toMapLocation(location) {
+    return {
+        ...location,
+        lat: location.latitude,
+        lng: location.longitude,
+        reviews: location.total_reviews,
+        hours: '',
+        phone: location.phone || '-'
+    };
+}
+
+// Add cluster marker, clicking it zooms into the cluster
+function addClusterMarker(cluster) {
+    const marker = new google.maps.Marker({
+        position: { lat: cluster.latitude, lng: cluster.longitude },
+        map: map,
+        title: `${cluster.count} lokasi (rating terbaik ${cluster.best_rating})`,
+        label: {
+            text: String(cluster.count),
+            color: '#ffffff',
+            fontWeight: 'bold'
+        },
+        icon: {
+            path: google.maps.SymbolPath.CIRCLE,
+            scale: Math.min(14 + Math.log2(cluster.count) * 3, 32),
+            fillColor: '#dc2626',
+            fillOpacity: 0.9,
+            strokeColor: '#ffffff',
+            strokeWeight: 2
+        }
+    });
+    
+    marker.addListener('click', () => {
+        map.setCenter(marker.getPosition());
+        map.setZoom(map.getZoom() + 2);
+    });
+    
+    markers.push(marker);
+}
+
 // Show location info window
 function showLocationInfo(location, marker) {
     const distance = userLocation ? 
@@ -455,6 +538,7 @@ function performSearch() {
 
 // Search location
 function searchLocation(location, service = '', radius = 10) {
+    searchMode = true;
     map.setCenter(location);
     map.setZoom(14);
     
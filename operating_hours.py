@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta, timezone
+import json
+import re
+import threading
+import time
+
+# Keys used in TambalLocation.operating_hours, Monday first like datetime.weekday()
+DAYS = ['senin', 'selasa', 'rabu', 'kamis', 'jumat', 'sabtu', 'minggu']
+
+MINUTES_PER_DAY = 24 * 60
+
+# Operating hours are written in local time (WIB)
+LOCAL_TIMEZONE = timezone(timedelta(hours=7))
+
+_RANGE_PATTERN = re.compile(r'(\d{1,2})[:.](\d{2})\s*-\s*(\d{1,2})[:.](\d{2})')
+
+def parse_day_hours(value):
+    """Parse one day, e.g. '08:00-17:00', '24 Jam' or 'Tutup', into [(start, end)] minutes.
+
+    Ranges ending before they start (e.g. '22:00-06:00') are returned with an
+    end past midnight and split by parse_operating_hours.
+    """
+    if not value:
+        return []
+
+    text = str(value).strip().lower()
+    if '24' in text and 'jam' in text:
+        return [(0, MINUTES_PER_DAY)]
+
+    intervals = []
+    for start_hour, start_minute, end_hour, end_minute in _RANGE_PATTERN.findall(text):
+        start = int(start_hour) * 60 + int(start_minute)
+        end = int(end_hour) * 60 + int(end_minute)
+        if start == end:
+            continue
+        if end < start:
+            end += MINUTES_PER_DAY
+        intervals.append((min(start, MINUTES_PER_DAY), min(end, 2 * MINUTES_PER_DAY)))
+    return intervals
+
+def parse_operating_hours(operating_hours):
+    """Parse the operating_hours JSON into 7 weekday lists of (start, end) minute intervals"""
+    if isinstance(operating_hours, str):
+        try:
+            operating_hours = json.loads(operating_hours)
+        except ValueError:
+            operating_hours = {}
+    if not isinstance(operating_hours, dict):
+        operating_hours = {}
+
+    hours = {str(day).strip().lower(): value for day, value in operating_hours.items()}
+    schedule = [[] for _ in DAYS]
+    for weekday, day in enumerate(DAYS):
+        for start, end in parse_day_hours(hours.get(day)):
+            schedule[weekday].append((start, min(end, MINUTES_PER_DAY)))
+
+            # Past midnight the shop is still open on the next day
+            if end > MINUTES_PER_DAY:
+                schedule[(weekday + 1) % 7].append((0, end - MINUTES_PER_DAY))
+
+    return tuple(tuple(sorted(intervals)) for intervals in schedule)
+
+def is_open(schedule, weekday, minute):
+    """Check whether a parsed schedule is open at a weekday/minute"""
+    return any(start <= minute < end for start, end in schedule[weekday])
+
+def local_time_slot(moment=None):
+    """Get the (weekday, minute of day) of a datetime in local time, now by default
+
+    Naive datetimes are taken as local time.
+    """
+    if moment is None:
+        moment = datetime.now(LOCAL_TIMEZONE)
+    elif moment.tzinfo is None:
+        moment = moment.replace(tzinfo=LOCAL_TIMEZONE)
+    else:
+        moment = moment.astimezone(LOCAL_TIMEZONE)
+    return moment.weekday(), moment.hour * 60 + moment.minute
+
+class OperatingHoursIndex:
+    """Pre-parsed operating hours of active locations, bucketed per weekday hour.
+
+    Schedules are parsed once when the index is loaded or a location is
+    written, so "open now" filters never parse JSON per row per request.
+    """
+
+    def __init__(self, timer=time.monotonic):
+        self._timer = timer
+        self._schedules = {}
+        self._buckets = {}
+        self._lock = threading.RLock()
+        self._loaded_at = None
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def is_fresh(self, max_age):
+        """Check whether the index was loaded less than max_age seconds ago"""
+        loaded_at = self._loaded_at
+        return loaded_at is not None and self._timer() - loaded_at < max_age
+
+    def load(self, rows):
+        """Replace index content with (location_id, operating_hours) rows"""
+        with self._lock:
+            self._schedules = {}
+            self._buckets = {}
+            for location_id, operating_hours in rows:
+                self._insert(location_id, parse_operating_hours(operating_hours))
+            self._loaded_at = self._timer()
+
+    def clear(self):
+        with self._lock:
+            self._schedules = {}
+            self._buckets = {}
+            self._loaded_at = None
+
+    def _slots(self, schedule):
+        for weekday, intervals in enumerate(schedule):
+            for start, end in intervals:
+                for hour in range(start // 60, (end - 1) // 60 + 1):
+                    yield weekday, hour
+
+    def _insert(self, location_id, schedule):
+        self._schedules[location_id] = schedule
+        for slot in set(self._slots(schedule)):
+            self._buckets.setdefault(slot, set()).add(location_id)
+
+    def _remove(self, location_id):
+        schedule = self._schedules.pop(location_id, None)
+        if schedule is None:
+            return
+        for slot in set(self._slots(schedule)):
+            members = self._buckets.get(slot)
+            if members is not None:
+                members.discard(location_id)
+                if not members:
+                    del self._buckets[slot]
+
+    def upsert(self, location_id, operating_hours):
+        schedule = parse_operating_hours(operating_hours)
+        with self._lock:
+            self._remove(location_id)
+            self._insert(location_id, schedule)
+
+    def remove(self, location_id):
+        with self._lock:
+            self._remove(location_id)
+
+    def open_ids(self, weekday, minute):
+        """Get the set of location ids open at a weekday/minute"""
+        with self._lock:
+            members = self._buckets.get((weekday, minute // 60), ())
+            return {
+                location_id for location_id in members
+                if is_open(self._schedules[location_id], weekday, minute)
+            }
+
+operating_hours_index = OperatingHoursIndex()
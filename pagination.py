@@ -0,0 +1,85 @@
+from flask import jsonify, request
+from sqlalchemy import and_, or_
+from src.models.user import db
+from src.routes.cache import TTLCache
+from datetime import datetime
+import base64
+import json
+
+# Approximate totals for cursor pages, shared by the list endpoints
+count_cache = TTLCache(maxsize=4096, ttl=60)
+
+def keyset_index(name, model, owner):
+    """Declare the (owner, created_at, id) index a cursor walk scans, unless the model has it, see schema.sql"""
+    if not any(index.name == name for index in model.__table__.indexes):
+        db.Index(name, owner, model.created_at, model.id)
+
+def encode_cursor(created_at, item_id):
+    """Encode a (created_at, id) position as an opaque URL-safe cursor"""
+    payload = json.dumps([created_at.isoformat(), item_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor into (created_at, id), raises ValueError when malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Cursor tidak valid') from e
+
+def cursor_page(query, model, limit, cursor=None, count_key=None):
+    """Fetch one page ordered by (created_at, id) descending, newest first.
+
+    Returns (items, meta) where meta holds next_cursor and limit, plus a
+    total cached for a minute under count_key when one is given. The page is
+    a range scan from the cursor position, so deep pages cost the same as
+    the first one.
+    """
+    limit = max(1, limit)
+    meta = {'limit': limit}
+
+    if count_key is not None:
+        meta['total'] = count_cache.get_or_set(count_key, lambda: query.order_by(None).count())
+
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < item_id)
+        ))
+
+    items = query.order_by(model.created_at.desc(), model.id.desc())\
+                 .limit(limit + 1)\
+                 .all()
+
+    has_more = len(items) > limit
+    items = items[:limit]
+    meta['next_cursor'] = encode_cursor(items[-1].created_at, items[-1].id) if has_more else None
+
+    return items, meta
+
+def cursor_page_response(query, model, limit, items_key, count_key):
+    """Answer a ?cursor= request with one page of query as {items_key: [...], next_cursor, limit}
+
+    The total is only counted, and cached under count_key, when the client
+    sends include_total=true.
+    """
+    include_total = request.args.get('include_total', 'false').lower() == 'true'
+    try:
+        items, page = cursor_page(
+            query, model, limit,
+            cursor=request.args.get('cursor'),
+            count_key=count_key if include_total else None
+        )
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'Cursor tidak valid'
+        }), 400
+
+    return jsonify({
+        'success': True,
+        items_key: [item.to_dict() for item in items],
+        **page
+    }), 200
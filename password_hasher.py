@@ -0,0 +1,132 @@
+from werkzeug.security import generate_password_hash, check_password_hash
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import hashlib
+import os
+import threading
+import time
+
+# Default lower bound of the iteration count (OWASP 2021 guidance for PBKDF2-HMAC-SHA256),
+# PASSWORD_HASH_MIN_ITERATIONS raises or lowers it
+MIN_ITERATIONS = 310000
+
+# Stored hashes within this fraction below PASSWORD_HASH_ITERATIONS are not rehashed
+REHASH_TOLERANCE = 0.2
+
+# Calibrated iterations aim for this much CPU time per hash (seconds)
+TARGET_HASH_SECONDS = 0.25
+
+# Hashes wait at most this long for a worker before giving up (seconds)
+HASH_TIMEOUT = 10
+
+class HasherBusy(Exception):
+    """All hashing workers and queue slots are taken, the client should retry later"""
+
+    def __init__(self, retry_after=1):
+        super().__init__('Password hasher busy')
+        self.retry_after = retry_after
+
+def _method_iterations(password_hash):
+    """Get the PBKDF2-SHA256 iterations of a werkzeug hash, None for other methods"""
+    method = str(password_hash or '').split('$', 1)[0].split(':')
+    if len(method) == 3 and method[0] == 'pbkdf2' and method[1] == 'sha256' and method[2].isdigit():
+        return int(method[2])
+    if method[:2] == ['pbkdf2', 'sha256'] and len(method) == 2:
+        return 0
+    return None
+
+class PasswordHasher:
+    """PBKDF2-SHA256 password hashing on a bounded thread pool.
+
+    hashlib releases the GIL while deriving keys, so a burst of logins runs
+    on the pool instead of starving the request threads. At most
+    max_pending hashes may be running or queued; beyond that hash() and
+    verify() raise HasherBusy right away instead of piling up requests.
+
+    The iteration count is PASSWORD_HASH_ITERATIONS when configured, so
+    every worker and restart hashes alike; otherwise it is calibrated to
+    TARGET_HASH_SECONDS on startup. Either way it never goes below the floor.
+    """
+
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending or self.workers * 4
+        self.iterations = MIN_ITERATIONS
+        self.rehash_below = MIN_ITERATIONS
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configure(self, iterations=None, floor=None):
+        """Use the configured iteration count, or calibrate one when none is set, returns it"""
+        floor = int(floor or MIN_ITERATIONS)
+        if iterations:
+            self.iterations = max(floor, int(iterations))
+            self.rehash_below = self.iterations * (1 - REHASH_TOLERANCE)
+        else:
+            # Calibrated counts differ a little between workers, only hashes below the floor are upgraded
+            self.iterations = self.calibrate(floor=floor)
+            self.rehash_below = floor
+        return self.iterations
+
+    def calibrate(self, target_seconds=TARGET_HASH_SECONDS, floor=None, samples=5):
+        """Propose the iteration count taking about target_seconds on this machine
+
+        The best of several timings is used; the result is not applied here,
+        configure() or PASSWORD_HASH_ITERATIONS do that.
+        """
+        sample = 100000
+        elapsed = float('inf')
+        for _ in range(samples):
+            started = time.perf_counter()
+            hashlib.pbkdf2_hmac('sha256', b'calibration', os.urandom(16), sample)
+            elapsed = min(elapsed, time.perf_counter() - started)
+
+        # Round to 100k so machines of similar speed propose the same value
+        iterations = int(sample * target_seconds / max(elapsed, 1e-6)) // 100000 * 100000
+        return max(int(floor or MIN_ITERATIONS), iterations)
+
+    def _submit(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hasher')
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=HASH_TIMEOUT)
+        except FutureTimeout:
+            # The hash keeps its slot until it finishes, the client retries meanwhile
+            raise HasherBusy(retry_after=HASH_TIMEOUT)
+
+    @property
+    def method(self):
+        return f'pbkdf2:sha256:{self.iterations}'
+
+    def hash(self, password):
+        """Hash a password with the calibrated parameters"""
+        return self._submit(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Check a password against a werkzeug hash of any method"""
+        if not password_hash:
+            return False
+        return self._submit(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Check whether a hash uses clearly weaker PBKDF2 parameters than the current ones
+
+        That is below REHASH_TOLERANCE of a configured iteration count, or
+        below the floor when the count was calibrated. Hashes of other
+        methods (e.g. scrypt) are left alone.
+        """
+        iterations = _method_iterations(password_hash)
+        return iterations is not None and iterations < self.rehash_below
+
+password_hasher = PasswordHasher()
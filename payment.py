@@ -1,5 +1,9 @@
-from flask import Blueprint, jsonify, request
-from src.models.user import Payment, Booking, UserSession, db
+from flask import Blueprint, jsonify, request, g
+from src.models.user import Payment, Booking, db
+from src.models.location_models import LocationPopularity
+from src.routes.pagination import cursor_page_response, keyset_index
+from src.routes.session_auth import login_required
+from src.routes.rate_limit import rate_limit, limit_blueprint
 from datetime import datetime
 import secrets
 import hashlib
@@ -8,16 +12,11 @@ import json
 
 payment_bp = Blueprint('payment', __name__)
 
-def get_current_user(token):
-    """Get current user from token"""
-    if not token:
-        return None
-    
-    session = UserSession.query.filter_by(session_token=token).first()
-    if not session or session.is_expired():
-        return None
-    
-    return session.user
+# Blanket limit on every payment endpoint, /process has a tighter rule of its own;
+# gateway webhooks arrive from a few addresses and are not limited
+limit_blueprint(payment_bp, per_ip='120/minute', per_user='60/minute', exempt=('payment_webhook',))
+
+keyset_index('idx_payments_booking_created', Payment, Payment.booking_id)
 
 def generate_transaction_id():
     """Generate unique transaction ID"""
@@ -190,25 +189,12 @@ def calculate_fee():
         }), 500
 
 @payment_bp.route('/process', methods=['POST'])
+@login_required
+@rate_limit('payment.process', per_ip='30/minute', per_user='10/minute')
 def process_payment():
     """Process payment for booking"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
         data = request.get_json()
         
@@ -282,6 +268,7 @@ def process_payment():
             # Update booking status
             booking.payment_status = 'paid'
             booking.status = 'confirmed'
+            LocationPopularity.record(booking.location_id, LocationPopularity.BOOKING_PAID)
             
             db.session.commit()
             
@@ -469,25 +456,11 @@ def detect_card_type(card_number):
         return 'Unknown'
 
 @payment_bp.route('/status/<transaction_id>', methods=['GET'])
+@login_required
 def get_payment_status(transaction_id):
     """Get payment status"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
         # Find payment
         payment = Payment.query.filter_by(transaction_id=transaction_id).first()
@@ -518,37 +491,30 @@ def get_payment_status(transaction_id):
         }), 500
 
 @payment_bp.route('/history', methods=['GET'])
+@login_required
 def get_payment_history():
     """Get user's payment history"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
         # Get query parameters
         status = request.args.get('status')
         limit = request.args.get('limit', default=20, type=int)
         offset = request.args.get('offset', default=0, type=int)
         
-        # Build query through bookings
-        query = Payment.query.join(Booking).filter(Booking.user_id == user.id)
+        # Payments of the user's bookings; each booking is a range scan of
+        # (booking_id, created_at, id), so the cost follows the user's own
+        # payments, not the whole table a join sorted by created_at would read
+        user_bookings = db.session.query(Booking.id).filter(Booking.user_id == user.id)
+        query = Payment.query.filter(Payment.booking_id.in_(user_bookings))
         
         if status:
             query = query.filter(Payment.status == status)
         
+        # Keyset pagination when a cursor parameter is sent (empty for the first page)
+        if 'cursor' in request.args:
+            return cursor_page_response(query, Payment, limit, 'payments', ('payments', user.id, status))
+        
         # Get total count
         total = query.count()
         
@@ -607,6 +573,9 @@ def payment_webhook():
         if status == 'success':
             booking = Booking.query.get(payment.booking_id)
             if booking:
+                # Gateways retry webhooks, only the first success counts for popularity
+                if booking.payment_status != 'paid':
+                    LocationPopularity.record(booking.location_id, LocationPopularity.BOOKING_PAID)
                 booking.payment_status = 'paid'
                 booking.status = 'confirmed'
         
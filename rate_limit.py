@@ -0,0 +1,224 @@
+from flask import jsonify, request, g, current_app
+from src.routes.session_auth import resolve_session, get_bearer_token
+from functools import wraps
+import math
+import os
+import sqlite3
+import threading
+import time
+
+# Buckets untouched long enough to have refilled completely are dropped this often (seconds)
+EVICT_INTERVAL = 60
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+def parse_limit(limit):
+    """Parse '10/minute' into (capacity, tokens per second), None stays None"""
+    if limit is None:
+        return None
+    count, _, period = str(limit).partition('/')
+    seconds = PERIODS[period.strip().lower() or 'second']
+    capacity = float(count)
+    return capacity, capacity / seconds
+
+class MemoryBucketStore:
+    """Token buckets of this process: key -> [tokens, updated_at, full_at]"""
+
+    def __init__(self, evict_interval=EVICT_INTERVAL, timer=time.monotonic):
+        self._timer = timer
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._evict_interval = evict_interval
+        self._evicted_at = timer()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, buckets, cost=1.0):
+        """Take cost tokens from every (key, capacity, rate) bucket, or from none of them
+
+        Returns the seconds to wait until all of them have room (0 when allowed).
+        """
+        with self._lock:
+            now = self._timer()
+            if now - self._evicted_at >= self._evict_interval:
+                self._evict(now)
+
+            levels = []
+            wait = 0.0
+            for key, capacity, rate in buckets:
+                bucket = self._buckets.get(key)
+                tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                if tokens < cost:
+                    wait = max(wait, (cost - tokens) / rate)
+                levels.append((key, capacity, rate, tokens))
+
+            if wait:
+                return wait
+
+            for key, capacity, rate, tokens in levels:
+                tokens -= cost
+                self._buckets[key] = [tokens, now, now + (capacity - tokens) / rate]
+            return 0.0
+
+    def _evict(self, now):
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+        self._evicted_at = now
+
+    def clear(self):
+        with self._lock:
+            self._buckets = {}
+
+class SQLiteBucketStore:
+    """Token buckets shared by the worker processes of one host through a SQLite file"""
+
+    def __init__(self, path, evict_interval=EVICT_INTERVAL):
+        self.path = path
+        self._evict_interval = evict_interval
+        self._evicted_at = 0.0
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_buckets '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def take(self, buckets, cost=1.0):
+        """Take cost tokens from every (key, capacity, rate) bucket, or from none of them
+
+        Returns the seconds to wait until all of them have room (0 when allowed).
+        """
+        connection = self._connection()
+        now = time.time()
+
+        # IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if now - self._evicted_at >= self._evict_interval:
+                connection.execute('DELETE FROM rate_limit_buckets WHERE full_at <= ?', (now,))
+                self._evicted_at = now
+
+            levels = []
+            wait = 0.0
+            for key, capacity, rate in buckets:
+                row = connection.execute('SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?', (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+                if tokens < cost:
+                    wait = max(wait, (cost - tokens) / rate)
+                levels.append((key, capacity, rate, tokens))
+
+            if not wait:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)',
+                    [(key, tokens - cost, now, now + (capacity - tokens + cost) / rate) for key, capacity, rate, tokens in levels]
+                )
+            connection.execute('COMMIT')
+            return wait
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def clear(self):
+        self._connection().execute('DELETE FROM rate_limit_buckets')
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store():
+    """Get the bucket store selected by RATE_LIMIT_BACKEND ('memory' or 'sqlite')"""
+    config = current_app.config
+    backend = config.get('RATE_LIMIT_BACKEND', 'memory')
+    key = (backend, config.get('RATE_LIMIT_SQLITE_PATH'))
+
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            if backend == 'sqlite':
+                path = config.get('RATE_LIMIT_SQLITE_PATH') or os.path.join(current_app.root_path, 'database', 'rate_limit.db')
+                store = SQLiteBucketStore(path)
+            else:
+                store = MemoryBucketStore()
+            _stores[key] = store
+        return store
+
+def too_many_requests(retry_after):
+    response = jsonify({
+        'success': False,
+        'message': 'Terlalu banyak permintaan, silakan coba lagi nanti'
+    })
+    response.headers['Retry-After'] = str(max(1, int(math.ceil(retry_after))))
+    return response, 429
+
+def check_rate_limit(name, per_ip=None, per_user=None, user_key=None):
+    """Take one token from the IP and user buckets of a rule, returns a 429 response or None
+
+    RATE_LIMITS in the app config overrides the limits per rule, e.g.
+    {'auth.login:ip': '20/minute', 'auth.login:user': None}; None disables.
+    """
+    config = current_app.config
+    if not config.get('RATE_LIMIT_ENABLED', True):
+        return None
+
+    overrides = config.get('RATE_LIMITS', {})
+    identities = []
+
+    ip_limit = parse_limit(overrides.get(f'{name}:ip', per_ip))
+    if ip_limit:
+        identities.append((f'{name}:ip:{request.remote_addr}', ip_limit))
+
+    user_limit = parse_limit(overrides.get(f'{name}:user', per_user))
+    if user_limit:
+        user = user_key() if user_key else getattr(g.get('current_user'), 'id', None)
+        if user is not None:
+            identities.append((f'{name}:user:{user}', user_limit))
+
+    if not identities:
+        return None
+
+    # A request rejected by one bucket costs nothing in the others
+    retry_after = get_store().take([(key, capacity, rate) for key, (capacity, rate) in identities])
+    return too_many_requests(retry_after) if retry_after else None
+
+def rate_limit(name, per_ip=None, per_user=None, user_key=None):
+    """Limit a view with token buckets per client IP and per user, e.g. per_ip='10/minute'
+
+    The user is g.current_user (put the decorator below login_required) or
+    whatever user_key() returns, such as the email a login targets.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limited = check_rate_limit(name, per_ip, per_user, user_key)
+            if limited is not None:
+                return limited
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def bearer_user_id():
+    """User id of the request's Bearer token, None when missing or invalid"""
+    resolved = resolve_session(get_bearer_token())
+    return resolved[0].id if resolved else None
+
+def limit_blueprint(blueprint, per_ip=None, per_user=None, exempt=()):
+    """Apply one IP/user limit to every request of a blueprint, the rule is named after it
+
+    This runs before login_required, so the user comes from the Bearer token
+    itself; requests without a valid token only count against the IP.
+    exempt lists view function names left out, e.g. gateway webhooks.
+    """
+    @blueprint.before_request
+    def blueprint_rate_limit():
+        if request.endpoint and request.endpoint.rsplit('.', 1)[-1] in exempt:
+            return None
+        return check_rate_limit(blueprint.name, per_ip, per_user, bearer_user_id if per_user else None)
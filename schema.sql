@@ -139,3 +139,71 @@ CREATE INDEX idx_support_messages_user ON support_messages(user_id);
 CREATE INDEX idx_user_sessions_token ON user_sessions(session_token);
 CREATE INDEX idx_user_sessions_user ON user_sessions(user_id);
 
+
+-- Tabel layanan per lokasi (normalisasi dari kolom JSON services)
+CREATE TABLE location_services (
+    location_id INT NOT NULL,
+    service VARCHAR(50) NOT NULL,
+    PRIMARY KEY (location_id, service),
+    FOREIGN KEY (location_id) REFERENCES tambal_locations(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_location_services_service ON location_services(service, location_id);
+
+-- Tabel agregat rating per lokasi (jumlah, banyaknya rating dan histogram bintang 1-5)
+CREATE TABLE location_rating_stats (
+    location_id INT PRIMARY KEY,
+    rating_sum DOUBLE NOT NULL DEFAULT 0,
+    review_count INT NOT NULL DEFAULT 0,
+    star_1 INT NOT NULL DEFAULT 0,
+    star_2 INT NOT NULL DEFAULT 0,
+    star_3 INT NOT NULL DEFAULT 0,
+    star_4 INT NOT NULL DEFAULT 0,
+    star_5 INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (location_id) REFERENCES tambal_locations(id) ON DELETE CASCADE
+);
+
+-- Index untuk keyset pagination (created_at, id)
+CREATE INDEX idx_reviews_location_created ON reviews(location_id, created_at, id);
+CREATE INDEX idx_bookings_user_created ON bookings(user_id, created_at, id);
+CREATE INDEX idx_payments_booking_created ON payments(booking_id, created_at, id);
+CREATE INDEX idx_support_messages_user_created ON support_messages(user_id, created_at, id);
+
+-- Full-text index untuk pencarian teks lokasi (MATCH ... AGAINST)
+CREATE FULLTEXT INDEX idx_tambal_locations_fulltext ON tambal_locations(name, address, description);
+
+-- Index untuk delta sync lokasi (/api/locations/changes?since=)
+CREATE INDEX idx_tambal_locations_updated_at ON tambal_locations(updated_at, id);
+
+-- Tabel skor popularitas per lokasi (forward decay dari booking dan review)
+CREATE TABLE location_popularity (
+    location_id INT PRIMARY KEY,
+    score DOUBLE NOT NULL DEFAULT 0,
+    FOREIGN KEY (location_id) REFERENCES tambal_locations(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_location_popularity_score ON location_popularity(score);
+
+-- Tabel alternatif terdekat per lokasi (JSON [{location_id, name, distance}])
+CREATE TABLE location_alternatives (
+    location_id INT PRIMARY KEY,
+    neighbours JSON NOT NULL,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (location_id) REFERENCES tambal_locations(id) ON DELETE CASCADE
+);
+
+-- Tabel pencabutan token bertanda tangan (logout, ganti password, nonaktif)
+CREATE TABLE token_revocations (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    jti VARCHAR(64),
+    user_id INT NOT NULL,
+    not_before BIGINT,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_token_revocations_expires ON token_revocations(expires_at);
+
+-- Index untuk penghapusan sesi expired secara berkala
+CREATE INDEX idx_user_sessions_expires ON user_sessions(expires_at);
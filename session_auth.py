@@ -0,0 +1,152 @@
+from flask import jsonify, request, g
+from src.models.user import User, UserSession, db
+from src.routes.cache import TTLCache
+from src.routes.signed_tokens import is_signed_token, decode_token
+from datetime import datetime
+from functools import wraps
+import threading
+
+# How long a resolved token is trusted without the database. Logout and
+# password changes invalidate this process at once; other worker processes
+# notice within this many seconds.
+SESSION_CACHE_TTL = 60
+
+# token -> (UserSnapshot, expires_at)
+session_cache = TTLCache(maxsize=10000, ttl=SESSION_CACHE_TTL)
+
+# user_id -> UserSnapshot for signed tokens, which carry only the user id
+user_snapshot_cache = TTLCache(maxsize=10000, ttl=SESSION_CACHE_TTL)
+
+# user_id -> tokens cached for that user, so all of them can be dropped at once
+_user_tokens = TTLCache(maxsize=10000, ttl=SESSION_CACHE_TTL)
+_user_tokens_lock = threading.Lock()
+
+class UserSnapshot:
+    """Read-only copy of the user fields a request needs, safe to share across requests"""
+
+    __slots__ = ('id', 'username', 'email', 'full_name', 'phone', 'is_active', '_public', '_profile')
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.full_name = user.full_name
+        self.phone = user.phone
+        self.is_active = user.is_active
+        self._public = user.to_public_dict()
+        self._profile = user.to_dict()
+
+    def to_public_dict(self):
+        return dict(self._public)
+
+    def to_dict(self):
+        return dict(self._profile)
+
+def get_bearer_token():
+    """Get the token of the Authorization: Bearer header, None when missing"""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+    return auth_header.split(' ')[1] or None
+
+def resolve_session(token):
+    """Get (UserSnapshot, expires_at) of a valid session token, None when unknown or expired
+
+    A cache miss costs one query joining the session with its user. Signed
+    tokens are verified in CPU, only the user snapshot may need a lookup.
+    """
+    if not token:
+        return None
+
+    if is_signed_token(token):
+        claims = decode_token(token)
+        if claims is None:
+            return None
+        snapshot = user_snapshot_cache.get_or_set(claims['uid'], lambda: _load_snapshot(claims['uid']))
+        return (snapshot, claims['expires_at']) if snapshot else None
+
+    now = datetime.utcnow()
+    cached = session_cache.get(token)
+    if cached is not None:
+        if cached[1] > now:
+            return cached
+        session_cache.pop(token)
+        return None
+
+    row = db.session.query(UserSession, User)\
+                    .join(User, User.id == UserSession.user_id)\
+                    .filter(UserSession.session_token == token)\
+                    .first()
+    if not row:
+        return None
+
+    session, user = row
+    if session.is_expired():
+        return None
+
+    cached = (UserSnapshot(user), session.expires_at)
+
+    # Never trust the cache past the session expiry
+    ttl = min(SESSION_CACHE_TTL, (session.expires_at - now).total_seconds())
+    session_cache.set(token, cached, ttl=ttl)
+    with _user_tokens_lock:
+        tokens = _user_tokens.get(user.id) or set()
+        tokens.add(token)
+        _user_tokens.set(user.id, tokens)
+
+    return cached
+
+def _load_snapshot(user_id):
+    user = User.query.get(user_id)
+    return UserSnapshot(user) if user else None
+
+def get_current_user(token):
+    """Get current user snapshot from token"""
+    resolved = resolve_session(token)
+    return resolved[0] if resolved else None
+
+def invalidate_token(token):
+    """Forget a cached token, e.g. after logout"""
+    session_cache.pop(token)
+
+def invalidate_user(user_id):
+    """Forget every cached token of a user, e.g. after a password or profile change"""
+    user_snapshot_cache.pop(user_id)
+    with _user_tokens_lock:
+        tokens = _user_tokens.pop(user_id) or set()
+    for token in tokens:
+        session_cache.pop(token)
+
+def login_required(view):
+    """Require a valid Bearer token, the user snapshot is available as g.current_user
+
+    g.session_token and g.session_expires_at hold the token and its expiry.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = get_bearer_token()
+        if not token:
+            return jsonify({
+                'success': False,
+                'message': 'Token tidak valid'
+            }), 401
+
+        try:
+            resolved = resolve_session(token)
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': 'Terjadi kesalahan server'
+            }), 500
+
+        if not resolved:
+            return jsonify({
+                'success': False,
+                'message': 'User tidak valid'
+            }), 401
+
+        g.current_user, g.session_expires_at = resolved
+        g.session_token = token
+        return view(*args, **kwargs)
+
+    return wrapper
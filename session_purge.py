@@ -0,0 +1,131 @@
+from src.models.user import UserSession, db
+from src.models.auth_models import TokenRevocation
+from src.routes.session_auth import invalidate_token
+from datetime import datetime
+import threading
+import time
+
+PURGE_BATCH_SIZE = 1000
+
+# Purge scans expires_at, see schema.sql
+if not any(index.name == 'idx_user_sessions_expires' for index in UserSession.__table__.indexes):
+    db.Index('idx_user_sessions_expires', UserSession.expires_at)
+
+class SessionMetrics:
+    """Counters of the session purge, shared by the CLI command, the timer and /session-metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.purged_total = 0
+        self.capped_total = 0
+        self.runs = 0
+        self.last_purge_at = None
+        self.last_purge_rows = 0
+        self.last_purge_seconds = 0.0
+
+    def record_purge(self, rows, seconds):
+        with self._lock:
+            self.runs += 1
+            self.purged_total += rows
+            self.last_purge_rows = rows
+            self.last_purge_seconds = seconds
+            self.last_purge_at = datetime.utcnow()
+
+    def record_capped(self, rows):
+        with self._lock:
+            self.capped_total += rows
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'purged_total': self.purged_total,
+                'capped_total': self.capped_total,
+                'runs': self.runs,
+                'last_purge_at': self.last_purge_at.isoformat() if self.last_purge_at else None,
+                'last_purge_rows': self.last_purge_rows,
+                'last_purge_seconds': round(self.last_purge_seconds, 3)
+            }
+
+session_metrics = SessionMetrics()
+
+def _delete_batches(model, condition, batch_size, max_batches):
+    """Delete matching rows batch by batch, one short transaction each"""
+    deleted = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = [row[0] for row in db.session.query(model.id).filter(condition).limit(batch_size).all()]
+        if not ids:
+            break
+        model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+        batches += 1
+    return deleted
+
+def purge_expired_sessions(batch_size=PURGE_BATCH_SIZE, max_batches=None):
+    """Delete expired user sessions and token revocations, returns the session row count
+
+    Batches keep each delete short so logins are never blocked for long.
+    """
+    started = time.monotonic()
+    now = datetime.utcnow()
+
+    purged = _delete_batches(UserSession, UserSession.expires_at < now, batch_size, max_batches)
+    _delete_batches(TokenRevocation, TokenRevocation.expires_at < now, batch_size, max_batches)
+
+    session_metrics.record_purge(purged, time.monotonic() - started)
+    return purged
+
+def enforce_session_cap(user_id, max_sessions):
+    """Delete a user's expired sessions and the oldest ones beyond max_sessions (caller commits)"""
+    sessions = db.session.query(UserSession.id, UserSession.session_token, UserSession.expires_at)\
+                         .filter(UserSession.user_id == user_id)\
+                         .order_by(UserSession.created_at.desc(), UserSession.id.desc())\
+                         .all()
+
+    now = datetime.utcnow()
+    live = [session for session in sessions if session.expires_at >= now]
+    stale = [session for session in sessions if session.expires_at < now] + live[max_sessions:]
+    if not stale:
+        return 0
+
+    UserSession.query.filter(UserSession.id.in_([session.id for session in stale]))\
+                     .delete(synchronize_session=False)
+    for session in stale:
+        invalidate_token(session.session_token)
+
+    session_metrics.record_capped(len(stale))
+    return len(stale)
+
+def session_table_stats():
+    """Get the current row counts of user_sessions"""
+    return {
+        'sessions_total': UserSession.query.count(),
+        'sessions_expired': UserSession.query.filter(UserSession.expires_at < datetime.utcnow()).count()
+    }
+
+_timer_lock = threading.Lock()
+_timer_started = False
+
+def start_purge_timer(app, interval):
+    """Start a daemon thread purging expired sessions every interval seconds, once per process"""
+    global _timer_started
+    with _timer_lock:
+        if _timer_started:
+            return False
+        _timer_started = True
+
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    purge_expired_sessions()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Gagal menghapus sesi expired')
+                finally:
+                    db.session.remove()
+
+    threading.Thread(target=run, name='session-purge', daemon=True).start()
+    return True
@@ -0,0 +1,176 @@
+from flask import current_app
+from src.models.user import db
+from src.models.auth_models import TokenRevocation
+from sqlalchemy import or_
+from datetime import datetime, timedelta
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+
+# v1.<key id>.<payload>.<signature>
+TOKEN_PREFIX = 'v1'
+
+# Longest session a login hands out (remember_me), revocations older than this are moot
+MAX_TOKEN_LIFETIME = timedelta(days=7)
+
+# How often each process picks up revocations written by other processes (seconds)
+REVOCATION_REFRESH_INTERVAL = 5
+
+# Rows this recent are re-read on every refresh, ids are not committed in order
+REVOCATION_REREAD_WINDOW = timedelta(seconds=60)
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode((text + '=' * (-len(text) % 4)).encode())
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+def is_signed_token(token):
+    return bool(token) and token.startswith(TOKEN_PREFIX + '.')
+
+def get_signing_keys():
+    """Get (current key id, {key id: secret}) from the app config
+
+    AUTH_SIGNING_KEYS maps key ids to secrets so keys can be rotated while
+    tokens signed with the previous one are still valid; by default the
+    app's SECRET_KEY is key 'k1'.
+    """
+    config = current_app.config
+    keys = config.get('AUTH_SIGNING_KEYS') or {'k1': config['SECRET_KEY']}
+    return config.get('AUTH_SIGNING_KEY_ID') or next(iter(keys)), keys
+
+def _sign(key, message):
+    return hmac.new(key.encode() if isinstance(key, str) else key, message.encode(), hashlib.sha256).digest()
+
+def issue_token(user_id, expires_at):
+    """Issue a signed token for a user valid until expires_at (naive UTC)"""
+    key_id, keys = get_signing_keys()
+    claims = {
+        'uid': user_id,
+        'exp': int((expires_at - datetime(1970, 1, 1)).total_seconds()),
+        'iat': _now_ms(),
+        'jti': secrets.token_urlsafe(12)
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    message = f'{TOKEN_PREFIX}.{key_id}.{payload}'
+    return f'{message}.{_b64encode(_sign(keys[key_id], message))}'
+
+def decode_token(token):
+    """Get the claims of a signed token, None when malformed, forged, expired or revoked
+
+    Pure CPU apart from the periodic revocation refresh.
+    """
+    try:
+        prefix, key_id, payload, signature = token.split('.')
+    except ValueError:
+        return None
+
+    _, keys = get_signing_keys()
+    if prefix != TOKEN_PREFIX or key_id not in keys:
+        return None
+
+    expected = _sign(keys[key_id], f'{prefix}.{key_id}.{payload}')
+    try:
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            return None
+        claims = json.loads(_b64decode(payload))
+        user_id, expires, issued_at = int(claims['uid']), int(claims['exp']), int(claims['iat'])
+    except (TypeError, ValueError, KeyError):
+        return None
+
+    if expires <= time.time():
+        return None
+
+    if revocations.is_revoked(claims.get('jti'), user_id, issued_at):
+        return None
+
+    claims['expires_at'] = datetime.utcfromtimestamp(expires)
+    return claims
+
+class RevocationList:
+    """In-memory mirror of token_revocations, refreshed every few seconds.
+
+    Revocations made by this process apply immediately; the table carries
+    them to the other worker processes.
+    """
+
+    def __init__(self, refresh_interval=REVOCATION_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._jtis = {}
+        self._not_before = {}
+        self._last_id = 0
+        self._refreshed_at = None
+        self._refreshed_wall = None
+
+    def clear(self):
+        with self._lock:
+            self._jtis = {}
+            self._not_before = {}
+            self._last_id = 0
+            self._refreshed_at = None
+            self._refreshed_wall = None
+
+    def _apply(self, jti, user_id, not_before, expires_at):
+        if jti:
+            self._jtis[jti] = expires_at
+        if not_before:
+            self._not_before[user_id] = max(self._not_before.get(user_id, 0), not_before)
+
+    def _refresh(self):
+        """Load revocations added since the last refresh and drop expired ones"""
+        now = datetime.utcnow()
+        query = db.session.query(
+            TokenRevocation.id, TokenRevocation.jti, TokenRevocation.user_id,
+            TokenRevocation.not_before, TokenRevocation.expires_at
+        ).filter(TokenRevocation.expires_at > now)
+        if self._refreshed_wall is not None:
+            query = query.filter(or_(TokenRevocation.id > self._last_id,
+                                     TokenRevocation.created_at >= self._refreshed_wall - REVOCATION_REREAD_WINDOW))
+
+        for row_id, jti, user_id, not_before, expires_at in query.all():
+            self._apply(jti, user_id, not_before, expires_at)
+            self._last_id = max(self._last_id, row_id)
+
+        # Tokens issued before an old cutoff have expired by now anyway
+        oldest = _now_ms() - int(MAX_TOKEN_LIFETIME.total_seconds() * 1000)
+        self._jtis = {jti: expires_at for jti, expires_at in self._jtis.items() if expires_at is None or expires_at > now}
+        self._not_before = {user_id: not_before for user_id, not_before in self._not_before.items() if not_before > oldest}
+        self._refreshed_at = time.monotonic()
+        self._refreshed_wall = now
+
+    def is_revoked(self, jti, user_id, issued_at):
+        with self._lock:
+            if self._refreshed_at is None or time.monotonic() - self._refreshed_at >= self.refresh_interval:
+                self._refresh()
+            return jti in self._jtis or issued_at < self._not_before.get(user_id, 0)
+
+    def revoke_token(self, claims):
+        """Revoke one token, e.g. on logout (caller commits, then calls confirm)"""
+        revocation = TokenRevocation(jti=claims['jti'], user_id=claims['uid'], expires_at=claims['expires_at'])
+        db.session.add(revocation)
+        return revocation
+
+    def revoke_user(self, user_id):
+        """Revoke every token of a user issued until now (caller commits, then calls confirm)"""
+        revocation = TokenRevocation(
+            user_id=user_id,
+            not_before=_now_ms(),
+            expires_at=datetime.utcnow() + MAX_TOKEN_LIFETIME
+        )
+        db.session.add(revocation)
+        return revocation
+
+    def confirm(self, revocation):
+        """Apply a committed revocation right away instead of waiting for the next refresh"""
+        with self._lock:
+            self._apply(revocation.jti, revocation.user_id, revocation.not_before, revocation.expires_at)
+
+revocations = RevocationList()
@@ -1,20 +1,13 @@
-from flask import Blueprint, jsonify, request
-from src.models.user import SupportMessage, UserSession, db
+from flask import Blueprint, jsonify, request, g
+from src.models.user import SupportMessage, db
+from src.routes.pagination import cursor_page_response, keyset_index
+from src.routes.session_auth import login_required, get_current_user, get_bearer_token
 from datetime import datetime
 import re
 
 support_bp = Blueprint('support', __name__)
 
-def get_current_user(token):
-    """Get current user from token"""
-    if not token:
-        return None
-    
-    session = UserSession.query.filter_by(session_token=token).first()
-    if not session or session.is_expired():
-        return None
-    
-    return session.user
+keyset_index('idx_support_messages_user_created', SupportMessage, SupportMessage.user_id)
 
 def validate_email(email):
     """Validate email format"""
@@ -57,12 +50,9 @@ def submit_contact_form():
         
         # Get user if authenticated
         user_id = None
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-            user = get_current_user(token)
-            if user:
-                user_id = user.id
+        user = get_current_user(get_bearer_token())
+        if user:
+            user_id = user.id
         
         # Create support message
         support_message = SupportMessage(
@@ -90,25 +80,11 @@ def submit_contact_form():
         }), 500
 
 @support_bp.route('/messages', methods=['GET'])
+@login_required
 def get_user_messages():
     """Get user's support messages"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
         # Get query parameters
         status = request.args.get('status')
@@ -121,6 +97,10 @@ def get_user_messages():
         if status:
             query = query.filter_by(status=status)
         
+        # Keyset pagination when a cursor parameter is sent (empty for the first page)
+        if 'cursor' in request.args:
+            return cursor_page_response(query, SupportMessage, limit, 'messages', ('support_messages', user.id, status))
+        
         # Get total count
         total = query.count()
         
@@ -145,25 +125,11 @@ def get_user_messages():
         }), 500
 
 @support_bp.route('/messages/<int:message_id>', methods=['GET'])
+@login_required
 def get_message(message_id):
     """Get specific support message"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
         # Get message
         message = SupportMessage.query.filter_by(id=message_id, user_id=user.id).first()
@@ -361,25 +327,11 @@ def chat_message():
         }), 500
 
 @support_bp.route('/stats', methods=['GET'])
+@login_required
 def get_support_stats():
     """Get support statistics (admin only)"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'message': 'Token tidak valid'
-            }), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_current_user(token)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User tidak valid'
-            }), 401
+        user = g.current_user
         
         # For now, return user's own message stats
         # In production, you might want to add admin role check